@@ -1,26 +1,150 @@
+import asyncio
+import signal
+import time
 from difflib import get_close_matches
 
 import discord
-
-from servoskull import ServoSkullError
-from servoskull.settings import CMD_PREFIX, DISCORD_TOKEN, ENV_PREFIX, AUTOGIF
+from discord.errors import ConnectionClosed
+from discord.gateway import DiscordWebSocket, ReconnectWebSocket, ResumeWebSocket
+
+from servoskull import ServoSkullError, dedup, executor, guildconfig, session, watchdog
+from servoskull.context import MessageContext
+from servoskull.settings import (
+    CMD_PREFIX, DISCORD_TOKEN, ENV_PREFIX, AUTORELOAD, OWNER_ID, SESSION_FILE, SESSION_SAVE_INTERVAL
+)
 from servoskull.skulllogging import logger
 from servoskull.commands import registry
-
-client = discord.Client()
-
-
-def get_command_by_prefix(message_string):
+from servoskull.commands.arguments import ArgumentError, tokenize
+
+started_at = time.monotonic()
+
+# Seconds between starting the process and responding to the first command
+time_to_first_command = None
+
+
+class ServoSkullClient(discord.Client):
+    """A Discord client that resumes the gateway session of a previous
+    process instead of identifying as a new session if possible."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Keeps the READY and GUILD_CREATE data of the current session up to date
+        self.session_recorder = session.Recorder()
+        self.resuming = False
+
+    def handle_socket_response(self, msg):
+        """Record the messages discord.py builds and updates its cache from.
+
+        This is called before discord.py parses the message."""
+        if msg.get('op') != DiscordWebSocket.DISPATCH:
+            return
+
+        if msg.get('t') == 'READY':
+            if self.resuming:
+                session.counters['resume_failures'] += 1
+                logger.warning('Could not resume the gateway session, identified as a new session')
+            session.counters['identifies'] += 1
+            self.resuming = False
+        elif msg.get('t') == 'RESUMED' and self.resuming:
+            session.counters['resumes'] += 1
+            self.resuming = False
+            logger.info('Resumed the gateway session {:.2f}s after start'.format(time.monotonic() - started_at))
+
+        self.session_recorder.record(msg.get('t'), msg.get('d'))
+
+    async def save_session(self):
+        """Save the session in the recorder's thread. Errors are logged, not raised,
+        so that neither the regular saving nor closing the client is interrupted."""
+        if not SESSION_FILE or not self.connection.session_id:
+            return
+
+        try:
+            await asyncio.wrap_future(
+                self.session_recorder.save(self.connection.session_id, self.connection.sequence)
+            )
+        except Exception as e:
+            logger.error('Could not save the gateway session: {}'.format(e), exc_info=True)
+
+    def _restore_session(self, saved):
+        """Rebuild the cache from the saved messages and prepare the state for resuming.
+
+        If the saved messages can't be parsed, the session file is deleted and
+        the state is reset so that the bot identifies as a new session."""
+        try:
+            for payload in saved['payloads']:
+                # Record the messages before discord.py changes them
+                self.session_recorder.record(payload['t'], payload['d'])
+                getattr(self.connection, 'parse_' + payload['t'].lower())(payload['d'])
+        except Exception as e:
+            session.counters['restore_failures'] += 1
+            logger.error('Could not restore the saved gateway session: {}'.format(e), exc_info=True)
+            session.clear()
+            # The READY message of the new session resets the recorder's snapshot
+            self.connection.clear()
+            self.resuming = False
+            return
+
+        # Discord sends the messages received after the session was saved again
+        recent_messages.remember(session.load_message_ids())
+        self.connection.session_id = saved['session_id']
+        self.connection.sequence = saved['sequence']
+        self.resuming = True
+
+    async def connect(self):
+        """Connect to the gateway like `discord.Client.connect` but try to
+        resume a saved session first. If Discord doesn't accept the session,
+        discord.py identifies as a new session."""
+        saved = session.load() if SESSION_FILE else None
+        if saved:
+            logger.info('Trying to resume gateway session {}'.format(saved['session_id']))
+            self._restore_session(saved)
+
+        self.ws = await DiscordWebSocket.from_client(self, resume=self.resuming)
+
+        while not self.is_closed:
+            try:
+                await self.ws.poll_event()
+            except (ReconnectWebSocket, ResumeWebSocket) as e:
+                resume = type(e) is ResumeWebSocket
+                logger.info('Got {}'.format(type(e).__name__))
+                self.ws = await DiscordWebSocket.from_client(self, resume=resume)
+            except ConnectionClosed as e:
+                await self.close()
+                if e.code != 1000:
+                    raise
+
+    async def close(self):
+        """Save the session and close the connection without invalidating the session."""
+        if self.is_closed:
+            return
+
+        await self.save_session()
+
+        if self.ws is not None and self.ws.open:
+            # Discord invalidates the session if the connection is closed with code 1000
+            await self.ws.close(code=4000)
+
+        await super().close()
+
+
+client = ServoSkullClient()
+
+module_watcher = None
+
+session_saver = None
+
+recent_messages = dedup.RecentMessages()
+
+
+def get_command_by_prefix(message_string, prefix=CMD_PREFIX):
     """Extract the command an its arguments from a string
     starting with a command prefix.
 
     The command is the word prepended by the configured command prefix.
     The arguments are a list of words followed by the command.
     """
-    command = message_string.split()[0][len(CMD_PREFIX):]
-    arguments = message_string.split()[1:]
+    words = tokenize(message_string)
 
-    return command, arguments
+    return words[0][len(prefix):], words[1:]
 
 
 def get_command_by_mention(message_string, client_id):
@@ -31,7 +155,7 @@ def get_command_by_mention(message_string, client_id):
     word the begins with `@` (mentions).
     The arguments are a list of words followed by the command.
     """
-    words = [word for word in message_string.split() if client_id not in word]
+    words = [word for word in tokenize(message_string) if client_id not in word]
     command = words[0]
     arguments = words[1:]
 
@@ -40,18 +164,41 @@ def get_command_by_mention(message_string, client_id):
 
 def get_closest_command(command):
     """Given a string, return the command that's most similar to it."""
-    available_commands = {**registry.get_regular_commands(), **registry.get_sound_commands()}
-
-    closest_commands = get_close_matches(command.lower(), available_commands, 1)
+    closest_commands = get_close_matches(command.lower(), registry.get_active_commands(), 1)
     if len(closest_commands) >= 1:
         return closest_commands[0]
     else:
         return None
 
 
+def is_owner(user_id):
+    """Return True if the user is the configured owner of the bot."""
+    return OWNER_ID is not None and user_id == OWNER_ID
+
+
 @client.event
 async def on_ready():
     logger.info('Logged in as {} ({})'.format(client.user.name, client.user.id))
+    watchdog.start(client.loop)
+
+    global module_watcher
+    if AUTORELOAD and module_watcher is None:
+        module_watcher = client.loop.create_task(registry.watch_modules())
+
+    global session_saver
+    if session_saver is None:
+        session_saver = client.loop.create_task(save_session_regularly())
+
+
+async def save_session_regularly():
+    """Save the session regularly so that it can be resumed even if the bot doesn't shut down cleanly.
+
+    The saved sequence number may be behind, so Discord replays some events that were already
+    handled. The IDs of messages received since the last save are stored by the session
+    recorder and ignored in `on_message` after a restart."""
+    while not client.is_closed:
+        await asyncio.sleep(SESSION_SAVE_INTERVAL)
+        await client.save_session()
 
 
 @client.event
@@ -65,44 +212,68 @@ async def on_message(message):
         # Don't trigger on @here etc.
         return
 
+    if recent_messages.is_duplicate(message.id):
+        # Discord can deliver messages again after reconnecting
+        logger.debug('Ignoring duplicate message {}'.format(message.id))
+        return
+
     command = None
     arguments = None
+    context = MessageContext.from_message(message)
+    config = guildconfig.store.get(context.server_id)
 
-    await execute_passive_commands(message)
+    await execute_passive_commands(message, context, config)
 
     logger.debug('Read message: "{}"'.format(message.content))
-    if message.content.startswith(CMD_PREFIX):
-        command, arguments = get_command_by_prefix(message.content)
+    if message.content.startswith(config.prefix):
+        command, arguments = get_command_by_prefix(message.content, config.prefix)
         logger.debug('Read command by prefix - command: "{}"; arguments: {}'.format(command, arguments))
     elif client.user.mentioned_in(message):
         command, arguments = get_command_by_mention(message.content, client.user.id)
         logger.debug('Read command by mention - command: "{}"; arguments: {}'.format(command, arguments))
 
     if command:
-        await execute_command(command, arguments, message)
+        await execute_command(command, arguments, message, context, config)
 
 
-async def execute_command(command, arguments, message):
-    commands = {**registry.get_regular_commands(), **registry.get_sound_commands()}
-    if command not in commands:
+async def execute_command(command, arguments, message, context, config=guildconfig.DEFAULT_CONFIG):
+    if command not in registry.get_active_commands():
         logger.debug('User {} issued non-existing command "{}"'.format(message.author, command))
-        response = 'No such command "{}".'.format(command, get_closest_command(command))
-        closest_command = get_closest_command(command)
+        response = 'No such command "{}".'.format(command)
+        with watchdog.attribute('closest command lookup'):
+            closest_command = get_closest_command(command)
         if closest_command:
             response += ' Did you mean {}?'.format(closest_command)
-        response += '\nTry `!help` for a list of commands'
-        if AUTOGIF:
-            # If AUTOGIF is enable with an env var, also respond with a GIF that matches
+        response += '\nTry `{}help` for a list of commands'.format(config.prefix)
+        if config.autogif and 'gif' in registry.get_active_commands() and 'gif' not in config.disabled_commands:
+            # If AUTOGIF is enabled, also respond with a GIF that matches
             # the command + arguments
-            gif = await registry.commands['gif']['class'](arguments=[command] + arguments).execute()
+            with watchdog.attribute('gif'):
+                gif = await registry.commands['gif']['class'](arguments=[command] + arguments, context=context).execute()
             if 'no gif found' not in gif.lower():
                 response += "\nAnyway, here's a GIF that matches your request:\n{}".format(gif)
         logger.info(response)
+    elif registry.commands[command]['owner'] and not is_owner(context.author_id):
+        logger.info('User {} is not allowed to use owner command "{}"'.format(message.author, command))
+        response = 'Only the owner of the bot can use this command.'
+    elif command in config.disabled_commands:
+        logger.debug('Command "{}" is disabled on this server'.format(command))
+        response = 'The command "{}" is disabled on this server.'.format(command)
     else:
         class_ = registry.commands[command]['class']
-        logger.debug('Executing command "{}"'.format(command))
-        command = class_(arguments=arguments, message=message, client=client)
-        response = await command.execute()
+        schema = registry.commands[command]['schema']
+        try:
+            # Validate the arguments before creating the command so that
+            # invalid invocations don't cause any work.
+            values = schema.parse(arguments)
+        except ArgumentError as error:
+            logger.debug('Invalid arguments for command "{}": {}'.format(command, error))
+            response = '{}\nUsage: **{}{}** {}'.format(error, config.prefix, command, schema.usage())
+        else:
+            logger.debug('Executing command "{}"'.format(command))
+            with watchdog.attribute(command):
+                instance = class_(arguments=arguments, values=values, context=context, client=client, config=config)
+                response = await executor.execute(command, instance)
 
     if response:
         # Only respond if there's actually a response.
@@ -113,21 +284,41 @@ async def execute_command(command, arguments, message):
             await client.send_message(message.channel, embed=response)
         logger.info(response)
 
+    global time_to_first_command
+    if time_to_first_command is None:
+        time_to_first_command = time.monotonic() - started_at
+        logger.info('Handled the first command {:.2f}s after start'.format(time_to_first_command))
 
-async def execute_passive_commands(message):
-    for command_class in registry.get_passive_commands().values():
-        command = command_class['class'](message=message)
-        response = None
 
-        if command.is_triggered():
-            logger.info('Message triggered passive command {}'.format(command_class))
-            response = await command.execute()
+async def execute_passive_commands(message, context, config=guildconfig.DEFAULT_CONFIG):
+    # Copy the commands because they can be reloaded while a command is executed
+    for name, command_class in list(registry.get_passive_commands().items()):
+        if name in config.disabled_passive_commands:
+            continue
+
+        with watchdog.attribute(name):
+            command = command_class['class'](context=context)
+            response = None
+
+            if command.is_triggered():
+                logger.info('Message triggered passive command {}'.format(command_class))
+                response = await command.execute()
 
         if response:
             await client.send_message(message.channel, response)
             logger.info(response)
 
 
+def handle_sigterm():
+    """Close the client when the process is terminated, e. g. by `docker stop`,
+    so that the session is saved. discord.py only does this for KeyboardInterrupt."""
+    try:
+        client.loop.add_signal_handler(signal.SIGTERM, lambda: client.loop.create_task(client.close()))
+    except NotImplementedError:
+        # Signal handlers aren't supported on Windows
+        pass
+
+
 if __name__ == '__main__':
     try:
         if not CMD_PREFIX:
@@ -138,8 +329,10 @@ if __name__ == '__main__':
             )
 
         logger.debug('Starting Discord client with token {}...'.format(DISCORD_TOKEN[:5]))
+        handle_sigterm()
         client.run(DISCORD_TOKEN)
     except ServoSkullError as error:
         logger.error(error, exc_info=True)
     finally:
         client.close()
+        executor.shutdown()
@@ -0,0 +1,152 @@
+"""Declarative argument schemas for commands.
+
+Commands list the arguments they take in `required_arguments`. When a command is
+registered that list is compiled into a `Schema` which the client uses to validate
+the words of a message before the command is created.
+"""
+import re
+
+from servoskull import ServoSkullError
+from servoskull import dice
+
+# Either text in double quotes or a word
+_TOKEN_REGEX = re.compile(r'"([^"]*)"|(\S+)')
+_MENTION_REGEX = re.compile(r'^<@!?(\d+)>$')
+
+
+class ArgumentError(ServoSkullError):
+    pass
+
+
+def tokenize(string):
+    """Split a string into a list of words in a single pass.
+
+    Text in double quotes is treated as a single word without the quotes.
+    """
+    return [
+        match.group(1) if match.group(1) is not None else match.group(2)
+        for match in _TOKEN_REGEX.finditer(string)
+    ]
+
+
+class Argument:
+    """An argument that takes a single word as it is.
+
+    optional: Whether the command can be called without the argument.
+    variadic: Whether the argument consumes all remaining words. Its value is a list.
+    """
+    def __init__(self, name, optional=False, variadic=False):
+        self.name = name
+        self.optional = optional
+        self.variadic = variadic
+
+    def __str__(self):
+        return self.name
+
+    def usage(self) -> str:
+        name = '{}...'.format(self.name) if self.variadic else self.name
+        if self.optional:
+            return '**[{}]**'.format(name)
+        return '**<{}>**'.format(name)
+
+    def convert(self, word):
+        """Return the value of the argument for a word or raise an `ArgumentError`."""
+        return word
+
+    def convert_variadic(self, words):
+        """Return the value of a variadic argument for the remaining words."""
+        return [self.convert(word) for word in words]
+
+
+class Integer(Argument):
+    """An argument that takes an integer, optionally bound by a minimum and maximum."""
+    def __init__(self, name, minimum=None, maximum=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def _error(self):
+        if self.minimum is not None and self.maximum is not None:
+            bounds = ' between {} and {}'.format(self.minimum, self.maximum)
+        elif self.minimum is not None:
+            bounds = ' >= {}'.format(self.minimum)
+        elif self.maximum is not None:
+            bounds = ' <= {}'.format(self.maximum)
+        else:
+            bounds = ''
+        return ArgumentError('Please specify a valid integer{} for {}'.format(bounds, self.usage()))
+
+    def convert(self, word):
+        try:
+            value = int(word)
+        except ValueError:
+            raise self._error() from None
+
+        if self.minimum is not None and value < self.minimum:
+            raise self._error()
+        if self.maximum is not None and value > self.maximum:
+            raise self._error()
+
+        return value
+
+
+class Mention(Argument):
+    """An argument that takes a mention of a user. Its value is the user's ID."""
+    def convert(self, word):
+        match = _MENTION_REGEX.match(word)
+        if not match:
+            raise ArgumentError('Please mention a user with `@` for {}'.format(self.usage()))
+
+        return match.group(1)
+
+
+class DiceExpression(Argument):
+    """An argument that takes a dice expression like `4d6kh3`. Its value is a `dice.Expression`.
+
+    If it's variadic, the remaining words are joined into one expression, e. g. `10d10 + 5`."""
+    def convert_variadic(self, words):
+        return self.convert(' '.join(words))
+
+    def convert(self, word):
+        try:
+            return dice.parse(word)
+        except dice.DiceError as e:
+            raise ArgumentError('{} for {}'.format(e, self.usage())) from None
+
+
+class Schema:
+    """The compiled list of arguments of a command."""
+    def __init__(self, arguments):
+        self.arguments = list(arguments)
+
+        for index, argument in enumerate(self.arguments):
+            if argument.variadic and index != len(self.arguments) - 1:
+                raise ServoSkullError('Variadic argument "{}" must be the last argument'.format(argument))
+            if index > 0 and self.arguments[index - 1].optional and not argument.optional:
+                raise ServoSkullError('Required argument "{}" must not follow an optional one'.format(argument))
+
+    def usage(self) -> str:
+        return ' '.join(argument.usage() for argument in self.arguments)
+
+    def parse(self, words) -> dict:
+        """Return a dict of argument names and their values for a list of words.
+
+        Words that are left over after all arguments have been consumed are ignored.
+        Raises an `ArgumentError` if a required argument is missing or invalid.
+        """
+        values = {}
+
+        for index, argument in enumerate(self.arguments):
+            if argument.variadic:
+                remaining = words[index:]
+                if not remaining and not argument.optional:
+                    raise ArgumentError('Missing argument {}'.format(argument.usage()))
+                values[argument.name] = argument.convert_variadic(remaining)
+            elif index < len(words):
+                values[argument.name] = argument.convert(words[index])
+            elif argument.optional:
+                values[argument.name] = None
+            else:
+                raise ArgumentError('Missing argument {}'.format(argument.usage()))
+
+        return values
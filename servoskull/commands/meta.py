@@ -1,7 +1,9 @@
 """Regular commands that are actively triggered by a user and need to know about all other commands."""
+from servoskull import ServoSkullError
 from servoskull.commands import registry
+from servoskull.commands.arguments import Argument
 from servoskull.commands.regular import Command
-from servoskull.settings import CMD_PREFIX
+from servoskull.guildconfig import store
 
 
 @registry.register('help')
@@ -14,30 +16,116 @@ class CommandHelp(Command):
         sound_commands = registry.get_sound_commands()
         passive_commands = registry.get_passive_commands()
 
+        prefix = self.config.prefix
+        disabled_commands = self.config.disabled_commands
+
         response = 'Available commands:'
         for command, dct in regular_commands.items():
+            if command in disabled_commands:
+                continue
             class_ = dct.get('class')
-            arguments = ''
-            for argument in class_.required_arguments:
-                arguments += '**<{}>** '.format(argument)
+            arguments = dct.get('schema').usage()
+            if arguments:
+                arguments += ' '
+            owner = ' (owner only)' if dct.get('owner') else ''
 
-            response += '\n  **{}{}** {}- {}'.format(CMD_PREFIX, command, arguments, class_.help_text)
+            response += '\n  **{}{}** {}- {}{}'.format(prefix, command, arguments, class_.help_text, owner)
 
         response += '\n\nAvailable sound commands:'
         for command, dct in sound_commands.items():
+            if command in disabled_commands:
+                continue
             class_ = dct.get('class')
-            arguments = ''
-            for argument in class_.required_arguments:
-                arguments += '**<{}>** '.format(argument)
+            arguments = dct.get('schema').usage()
+            if arguments:
+                arguments += ' '
 
-            response += '\n  **{}{}** {}- {}'.format(CMD_PREFIX, command, arguments, class_.help_text)
+            response += '\n  **{}{}** {}- {}'.format(prefix, command, arguments, class_.help_text)
 
         response += ('\n\nAvailable passive commands '
                      '(these trigger automatically if a message fulfills certain conditions):')
         for text, dct in passive_commands.items():
+            if text in self.config.disabled_passive_commands:
+                continue
             class_ = dct.get('class')
             response += '\n  **{}** - {}'.format(text, class_.help_text)
 
-        response += '\n\nEither prepend your command with `{}` or mention the bot using `@`.'.format(CMD_PREFIX)
+        response += '\n\nEither prepend your command with `{}` or mention the bot using `@`.'.format(prefix)
 
         return response
+
+
+@registry.register('reload', owner=True)
+class CommandReload(Command):
+    help_text = 'Load or reload a commands module without restarting the bot (e. g. `regular`)'
+    required_arguments = [Argument('module')]
+
+    async def execute(self) -> str:
+        """Load or reload a commands module and respond with the commands it registered."""
+        try:
+            triggers = registry.load_module(self.values['module'])
+        except Exception as e:
+            return 'Could not load module "{}": {}'.format(self.values['module'], e)
+
+        return 'Loaded module "{}" with commands: {}'.format(self.values['module'], ', '.join(triggers))
+
+
+@registry.register('unload', owner=True)
+class CommandUnload(Command):
+    help_text = 'Unload a commands module'
+    required_arguments = [Argument('module')]
+
+    async def execute(self) -> str:
+        """Unload a commands module and respond with the commands that were removed."""
+        try:
+            removed = registry.unload_module(self.values['module'])
+        except ServoSkullError as e:
+            return 'Could not unload module "{}": {}'.format(self.values['module'], e)
+
+        return 'Unloaded module "{}" with commands: {}'.format(self.values['module'], ', '.join(sorted(removed)))
+
+
+@registry.register('config', owner=True)
+class CommandConfig(Command):
+    help_text = ('Configure the bot for this server: `prefix <prefix>`, `autogif on|off`, '
+                 '`enable <command>` or `disable <command>`')
+    required_arguments = [Argument('setting', optional=True), Argument('value', optional=True, variadic=True)]
+
+    def _describe(self, config) -> str:
+        return 'Prefix: `{}`\nAUTOGIF: {}\nDisabled commands: {}\nDisabled passive commands: {}'.format(
+            config.prefix,
+            'on' if config.autogif else 'off',
+            ', '.join(sorted(config.disabled_commands)) or 'none',
+            ', '.join(sorted(config.disabled_passive_commands)) or 'none',
+        )
+
+    async def execute(self) -> str:
+        """Change a setting of the current server or respond with the current configuration."""
+        server_id = self.context.server_id
+        if not server_id:
+            return 'This command can only be used in a server.'
+
+        setting = self.values['setting']
+        value = ' '.join(self.values['value'])
+        config = store.get(server_id)
+
+        if not setting:
+            return self._describe(config)
+        elif setting == 'prefix' and value and ' ' not in value:
+            config = store.update(server_id, prefix=value)
+        elif setting == 'autogif' and value in ['on', 'off']:
+            config = store.update(server_id, autogif=value == 'on')
+        elif setting in ['enable', 'disable'] and value in registry.get_active_commands():
+            if registry.commands[value]['owner']:
+                return 'Owner commands cannot be disabled.'
+            disabled = config.disabled_commands
+            disabled = disabled - {value} if setting == 'enable' else disabled | {value}
+            config = store.update(server_id, disabled_commands=disabled)
+        elif setting in ['enable', 'disable'] and value in registry.get_passive_commands():
+            disabled = config.disabled_passive_commands
+            disabled = disabled - {value} if setting == 'enable' else disabled | {value}
+            config = store.update(server_id, disabled_passive_commands=disabled)
+        else:
+            return 'Invalid setting. {}'.format(self.help_text)
+
+        return 'Configuration updated.\n{}'.format(self._describe(config))
@@ -1,5 +1,7 @@
 """Commands that are triggered passively by messages in text channels that fulfill certain trigger conditions
 (e. g. containing some special text or a link)."""
+import re
+
 import aiohttp
 
 from servoskull.commands import registry
@@ -11,9 +13,12 @@ class PassiveCommand:
 
     A passive command is a command that is not actively triggered by a user but
     reacts to a message that contains a special keyword.
+
+    `context` is the `MessageContext` of the message, which is shared by
+    all passive commands.
     """
-    def __init__(self, message):
-        self.message = message
+    def __init__(self, context):
+        self.context = context
 
     async def execute(self) -> str:
         raise NotImplementedError()
@@ -29,17 +34,13 @@ class RedditCommentCommand(PassiveCommand):
     text and some info about the Reddit post."""
     help_text = 'Triggers when somebody posts a link to a Reddit comment'
 
-    def __init__(self, message):
-        import re
-
-        super().__init__(message)
-        self.regex = re.compile('https?://(www\.)?reddit.com/r/\w+/comments/[\w\d]+/[\w\d_]+/[\w\d]+')
+    regex = re.compile(r'https?://(www\.)?reddit.com/r/\w+/comments/[\w\d]+/[\w\d_]+/[\w\d]+')
 
     def is_triggered(self) -> bool:
-        return self.regex.search(self.message.content) is not None
+        return self.regex.search(self.context.content) is not None
 
     def _get_url(self):
-        for word in self.message.content.split():
+        for word in self.context.content.split():
             if self.regex.match(word):
                 return word.rstrip('/') + '.json'
 
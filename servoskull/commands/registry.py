@@ -1,20 +1,83 @@
+import asyncio
+import importlib
+import os
+import sys
 from functools import wraps
 
+from servoskull import ServoSkullError
+from servoskull.commands.arguments import Schema
+from servoskull.executor import EXECUTIONS, INLINE, reset_process_pool
+from servoskull.skulllogging import logger
+
 commands = {}
 
+# Modules the bot depends on that must never be loaded or unloaded as commands modules
+INFRASTRUCTURE_MODULES = {'servoskull.commands.registry', 'servoskull.commands.arguments'}
+
+# Lookups derived from `commands`. They are updated whenever a command is
+# registered or unregistered instead of being rebuilt for every message.
+_regular_commands = {}
+_sound_commands = {}
+_passive_commands = {}
+_active_commands = {}
+
+
+def _lookups_for(entry):
+    if entry['passive']:
+        return [_passive_commands] if not entry['sound'] else []
+    if entry['sound']:
+        return [_sound_commands, _active_commands]
+    return [_regular_commands, _active_commands]
+
+
+def _add(trigger, entry):
+    if trigger in commands:
+        _remove(trigger)
+
+    commands[trigger] = entry
+    for lookup in _lookups_for(entry):
+        lookup[trigger] = entry
+
 
-def register(trigger, passive=False, sound=False):
+def _remove(trigger):
+    entry = commands.pop(trigger)
+    for lookup in _lookups_for(entry):
+        lookup.pop(trigger, None)
+
+    return entry
+
+
+def register(trigger, passive=False, sound=False, owner=False, execution=INLINE):
     """A decorator that registers commands
 
     trigger: the string prepended by the command prefix users have
              to enter to trigger the command.
-    passive: Whether the command is a passive command."""
+    passive: Whether the command is a passive command.
+    owner: Whether only the owner of the bot may use the command.
+    execution: Where the command is executed, `executor.INLINE` on the event loop,
+               `executor.THREAD` or `executor.PROCESS` in a pool.
+
+    The `required_arguments` of regular and sound commands are compiled into
+    a `Schema` that's available as `schema` on the class and in the registry."""
+    if execution not in EXECUTIONS:
+        raise ServoSkullError('Invalid execution "{}" for command "{}"'.format(execution, trigger))
+
     def decorator(cls):
-        commands[trigger] = {
+        entry = {
             'passive': passive,
             'sound': sound,
+            'owner': owner,
+            'execution': execution,
+            'module': cls.__module__,
             'class': cls,
         }
+        cls.execution = execution
+
+        if not passive:
+            cls.schema = Schema(cls.required_arguments)
+            entry['schema'] = cls.schema
+
+        _add(trigger, entry)
 
         @wraps(cls)
         def wrapper(*args, **kwargs):
@@ -25,13 +88,178 @@ def register(trigger, passive=False, sound=False):
     return decorator
 
 
+def unregister(trigger):
+    """Remove a command from the registry."""
+    _remove(trigger)
+
+
 def get_regular_commands():
-    return {key: value for key, value in commands.items() if not value.get('passive') and not value.get('sound')}
+    return _regular_commands
 
 
 def get_sound_commands():
-    return {key: value for key, value in commands.items() if not value.get('passive') and value.get('sound')}
+    return _sound_commands
 
 
 def get_passive_commands():
-    return {key: value for key, value in commands.items() if value.get('passive') and not value.get('sound')}
+    return _passive_commands
+
+
+def get_active_commands():
+    """Return regular and sound commands, i. e. all commands a user can trigger."""
+    return _active_commands
+
+
+def get_modules():
+    """Return the names of all modules that registered commands."""
+    return {entry['module'] for entry in commands.values()}
+
+
+def _resolve_module_name(name):
+    """Allow modules in `servoskull.commands` to be referred to by their short name."""
+    if '.' not in name:
+        return 'servoskull.commands.{}'.format(name)
+    return name
+
+
+def _check_commands_module(name):
+    """Raise a `ServoSkullError` if a module isn't a loaded commands module."""
+    if name in INFRASTRUCTURE_MODULES or name not in get_modules():
+        raise ServoSkullError('"{}" is not a commands module'.format(name))
+
+
+def _restore(previous):
+    """Make the registry equal to a previous copy of `commands`, e. g. after
+    a module that registered some of its commands failed to import."""
+    for trigger in list(commands):
+        _remove(trigger)
+    for trigger, entry in previous.items():
+        _add(trigger, entry)
+
+
+def _get_triggers(name):
+    return sorted(trigger for trigger, entry in commands.items() if entry['module'] == name)
+
+
+def load_module(name):
+    """Import a module and register its commands.
+
+    Modules that are already imported can only be loaded again if they
+    registered commands. A new module that doesn't register any commands
+    is forgotten again and a `ServoSkullError` is raised.
+
+    Returns the triggers of the commands the module registered."""
+    name = _resolve_module_name(name)
+    if name in sys.modules:
+        return reload_module(name)
+    if name in INFRASTRUCTURE_MODULES:
+        raise ServoSkullError('"{}" is not a commands module'.format(name))
+
+    # The module may have been created after the import system cached the directory's contents
+    importlib.invalidate_caches()
+    previous = dict(commands)
+    try:
+        importlib.import_module(name)
+    except Exception:
+        _restore(previous)
+        raise
+
+    triggers = _get_triggers(name)
+    if not triggers:
+        sys.modules.pop(name, None)
+        raise ServoSkullError('Module "{}" does not register any commands'.format(name))
+
+    logger.info('Loaded commands module {}'.format(name))
+    return triggers
+
+
+def unload_module(name):
+    """Unregister all commands of a module and forget the module so
+    that it's imported again the next time it's loaded.
+
+    Raises a `ServoSkullError` if the module isn't a loaded commands module
+    or if it contains owner commands, because they are needed to load it again.
+
+    Returns the removed registry entries."""
+    name = _resolve_module_name(name)
+    _check_commands_module(name)
+    if any(entry['owner'] for entry in commands.values() if entry['module'] == name):
+        raise ServoSkullError('"{}" contains owner commands and can only be reloaded'.format(name))
+
+    return _unload(name)
+
+
+def _unload(name):
+    removed = {trigger: _remove(trigger) for trigger, entry in list(commands.items()) if entry['module'] == name}
+    sys.modules.pop(name, None)
+    # Worker processes still have the old version of the module
+    reset_process_pool()
+    logger.info('Unloaded commands module {}'.format(name))
+
+    return removed
+
+
+def reload_module(name):
+    """Unload and load a module again.
+
+    If the module can't be imported, e. g. because of a syntax error, the
+    commands it registered before failing are removed, its previous commands
+    are registered again and the error is raised.
+
+    Raises a `ServoSkullError` if the module isn't a loaded commands module.
+
+    Returns the triggers of the commands the module registered."""
+    name = _resolve_module_name(name)
+    _check_commands_module(name)
+    module = sys.modules.get(name)
+    previous = dict(commands)
+    _unload(name)
+
+    try:
+        if module is not None:
+            # Reload the module object in place so that other modules that
+            # imported it see the new version.
+            sys.modules[name] = module
+            importlib.reload(module)
+        else:
+            importlib.import_module(name)
+    except Exception:
+        if module is not None:
+            sys.modules[name] = module
+        # Remove the commands the new version registered before it failed
+        _restore(previous)
+        raise
+
+    triggers = _get_triggers(name)
+    if not triggers:
+        # Forget the module so that it can be loaded again once it registers commands
+        sys.modules.pop(name, None)
+
+    logger.info('Reloaded commands module {}'.format(name))
+    return triggers
+
+
+def _get_mtimes():
+    mtimes = {}
+    for name in get_modules():
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path and os.path.exists(path):
+            mtimes[name] = os.path.getmtime(path)
+
+    return mtimes
+
+
+async def watch_modules(interval=2):
+    """Reload commands modules whenever their source file changes."""
+    mtimes = _get_mtimes()
+
+    while True:
+        await asyncio.sleep(interval)
+
+        for name, mtime in _get_mtimes().items():
+            if name in mtimes and mtime != mtimes[name]:
+                try:
+                    reload_module(name)
+                except Exception as error:
+                    logger.error('Could not reload {}: {}'.format(name, error), exc_info=True)
+            mtimes[name] = mtime
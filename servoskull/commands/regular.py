@@ -5,26 +5,53 @@ import aiohttp
 from discord import Embed
 from imperialdate import ImperialDate
 
+from servoskull import dice
+from servoskull.executor import INLINE, THREAD
+from servoskull.guildconfig import DEFAULT_CONFIG
 from servoskull.skulllogging import logger
 from servoskull.commands import registry
+from servoskull.commands.arguments import Argument, DiceExpression
 
 
 class Command:
-    """Base class for all commands."""
+    """Base class for all commands.
+
+    `required_arguments` is a list of `Argument`s. Their values are available
+    in `values` after the command has been created. If the client didn't already
+    validate the arguments, creating a command raises an `ArgumentError` for
+    invalid arguments.
+
+    `context` is the `MessageContext` of the message that triggered the command."""
     help_text = None
     required_arguments = []
+    schema = None
+    execution = INLINE
 
     def __init__(self, **kwargs):
-        self.arguments = kwargs.get('arguments')
-        self.message = kwargs.get('message')
+        self.arguments = kwargs.get('arguments') or []
+        self.context = kwargs.get('context')
         self.client = kwargs.get('client')
+        self.config = kwargs.get('config') or DEFAULT_CONFIG
+        self.values = kwargs.get('values')
+
+        if self.values is None and self.schema is not None:
+            self.values = self.schema.parse(self.arguments)
 
     async def execute(self):
+        """Execute the command. By default this calls `run` which is
+        only useful if the command isn't executed by the client."""
+        return self.run()
+
+    def run(self):
+        """Synchronous version of `execute` for commands that are executed
+        in a thread or process pool (see `servoskull.executor`)."""
         raise NotImplementedError()
 
-    def _get_mentions(self):
-        """Return Member/User objects for all mentioned users except the bot."""
-        return [member for member in self.message.mentions if member.id != self.client.user.id]
+    def _get_server(self):
+        """Return the server the message was sent on or None for private messages."""
+        if self.context.server_id is None:
+            return None
+        return self.client.get_server(self.context.server_id)
 
 
 @registry.register('yesno')
@@ -38,7 +65,7 @@ class CommandYesNo(Command):
 
 @registry.register('gif')
 class CommandGif(Command):
-    required_arguments = ['name or tag']
+    required_arguments = [Argument('name or tag', optional=True, variadic=True)]
     help_text = 'Respond with a gif from https://gifs.retzudo.com'
 
     GIFS_URL = 'https://gifs.retzudo.com/gifs.json'
@@ -46,7 +73,8 @@ class CommandGif(Command):
     async def execute(self):
         """Respond with a gif that matches a title or a tag of a gif
         at https://gifs.retzudo.com."""
-        if not self.arguments or len(self.arguments) < 1:
+        words = self.values['name or tag']
+        if not words:
             return 'Find a gif at https://gifs.retzudo.com'
 
         async with aiohttp.ClientSession() as session:
@@ -61,7 +89,7 @@ class CommandGif(Command):
             if 'tags' in gif:
                 haystack = '{} {}'.format(haystack, ' '.join([tag.lower() for tag in gif['tags']]))
 
-            if all(arg.lower() in haystack for arg in self.arguments):
+            if all(word.lower() in haystack for word in words):
                 response = Embed()
                 response.set_image(url=gif['url'])
                 return response
@@ -129,38 +157,33 @@ class CommandNextHoliday(Command):
         )
 
 
-@registry.register('roll')
+@registry.register('roll', execution=THREAD)
 class CommandRoll(Command):
-    help_text = 'Roll an n-sided die'
-    required_arguments = ['n']
+    help_text = ('Roll an n-sided die or dice like `4d6kh3` (keep highest 3), `2d20kl1` (keep lowest), '
+                 '`3d6!` (exploding) or `10d10+5`')
+    required_arguments = [DiceExpression('n or dice', variadic=True)]
 
-    async def execute(self) -> str:
-        """Respond with a roll of a die."""
-        try:
-            if not self.arguments or len(self.arguments) < 1:
-                raise ValueError()
-            sides = int(self.arguments[0])
-            if sides < 2:
-                raise ValueError()
-        except ValueError:
-            return 'Please specify a valid integer >= 2'
+    def run(self) -> str:
+        """Respond with the result of rolling the dice."""
+        expression = self.values['n or dice']
+        total, results = expression.roll()
 
-        return 'Rolled a {}-sided die: {}'.format(sides, random.randint(1, sides))
+        if expression.is_single_die():
+            return 'Rolled a {}-sided die: {}'.format(expression.terms[0].sides, total)
+
+        return dice.format_result(expression, total, results)
 
 
 @registry.register('xkcd')
 class CommandXkcd(Command):
     help_text = 'Retrieves the most relevant xkcd comic for your query'
-    required_arguments = ['query']
+    required_arguments = [Argument('query', variadic=True)]
 
     async def execute(self) -> str:
         """Search for an xkcd comic using https://relevant-xkcd.github.io"""
-        if not self.arguments or len(self.arguments) < 1:
-            return 'Please add a search query to your command.'
-
         url = 'https://relevant-xkcd-backend.herokuapp.com/search'
         data = {
-            'search': ' '.join(self.arguments).lower()
+            'search': ' '.join(self.values['query']).lower()
         }
         logger.info('Posting to URL {}: {}'.format(url, data))
 
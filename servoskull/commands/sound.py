@@ -1,10 +1,11 @@
 """Commands that are actively triggered by a user and require the bot to be connected to a voice channel."""
-import discord
 import youtube_dl
 
 from servoskull.commands import registry
+from servoskull.commands.arguments import Argument, Mention
 from servoskull.commands.regular import Command
 from servoskull.settings import USE_AVCONV
+from servoskull.soundlibrary import library
 
 
 class SoundCommand(Command):
@@ -24,27 +25,22 @@ class SoundCommand(Command):
 
     def _get_voice_client(self):
         """Return the currently connected voice client of the message's server."""
-        return self.message.server.voice_client
+        server = self._get_server()
+        return server.voice_client if server else None
 
 
 @registry.register('summon', sound=True)
 class CommandSummon(SoundCommand):
     help_text = "Summons the bot to the user's voice channel or to the voice channel of the user you mention with `@`."
-    required_arguments = ['user']
+    required_arguments = [Mention('user', optional=True)]
 
     async def execute(self) -> str:
         """Have the bot connect to the voice channel of the message's user.
 
         This class implements `execute` instead of `execute_sound` because the bot not being
         connected to a voice channel is a valid state for this command."""
-        connect_to_member = self.message.author
-
-        # If the message mentions exactly one user, connect to their channel instead
-        mentions = self._get_mentions()
-        if len(mentions) == 1:
-            connect_to_member = mentions[0]
-
-        if not isinstance(connect_to_member, discord.Member):
+        server = self._get_server()
+        if not server:
             # 1. Users can be Members of multiple Discord servers.
             # 2. This includes the bot
             # 3. The bot and the requesting User can share many servers.
@@ -52,7 +48,19 @@ class CommandSummon(SoundCommand):
             # unless we implement such a search ourselves.
             return 'Due to some Discord API limitation you need to issue this command in a channel.'
 
-        voice_channel = connect_to_member.voice.voice_channel
+        if self.values['user']:
+            # If a user is mentioned, connect to their channel instead
+            member = server.get_member(self.values['user'])
+            if not member:
+                return 'The user you mentioned is not a member of this server'
+            voice_channel = member.voice.voice_channel
+            user_name = member.nick or member.name
+        else:
+            voice_channel = None
+            if self.context.voice_channel_id:
+                voice_channel = server.get_channel(self.context.voice_channel_id)
+            user_name = self.context.author_nick or self.context.author_name
+
         if not voice_channel:
             return 'You are not connected to any voice channel'
 
@@ -65,12 +73,11 @@ class CommandSummon(SoundCommand):
                 await self.client.join_voice_channel(voice_channel)
             else:
                 await voice_client.move_to(voice_channel)
-            user_name = connect_to_member.nick or connect_to_member.name
             return 'Connected to {}\'s voice channel "{}"'.format(user_name, voice_channel.name)
 
         except ConnectionResetError as e:
             if voice_client:
-                voice_client.disconnect()
+                await voice_client.disconnect()
             return 'Could not connect to your voice channel: {}'.format(e)
 
 
@@ -87,33 +94,26 @@ class CommandDisconnect(SoundCommand):
 @registry.register('sound', sound=True)
 class CommandSound(SoundCommand):
     help_text = 'Play a sound (`sounds` for a list)'
-    required_arguments = ['sound']
-
-    # List of available sounds
-    sounds = {
-        'horn': {
-            'url': 'https://www.youtube.com/watch?v=9Jz1TjCphXE',
-            'volume': 0.1,
-        },
-    }
+    required_arguments = [Argument('sound')]
 
     async def execute_sound(self) -> str:
         """Play a sound."""
         voice_client = self._get_voice_client()
 
-        if not self.arguments or len(self.arguments) < 1:
-            return 'Use `sounds` for a list of sounds.'
-
-        sound_name = self.arguments[0]
-        sound = CommandSound.sounds.get(sound_name)
+        sound_name = self.values['sound']
+        sound = await library.get_async(sound_name)
         if not sound:
-            return 'No such sound "{}". Use `sounds` for a list of sounds'.format(sound_name)
+            response = 'No such sound "{}". Use `sounds` for a list of sounds'.format(sound_name)
+            suggestions = await library.search_async(sound_name, limit=5)
+            if suggestions:
+                response += ' or try one of these: {}'.format(', '.join(suggestions))
+            return response
 
         try:
             player = await voice_client.create_ytdl_player(
-                sound.get('url'),
+                sound.url,
                 use_avconv=USE_AVCONV,
-                options='-af "volume={}"'.format(sound.get('volume', 1.0))
+                options='-af "volume={}"'.format(sound.volume)
             )
             player.start()
         except youtube_dl.utils.DownloadError as e:
@@ -122,12 +122,25 @@ class CommandSound(SoundCommand):
 
 @registry.register('sounds', sound=True)
 class CommandSounds(Command):
-    help_text = 'Respond with a list of available sounds for voice channels'
+    help_text = 'Respond with a page of the list of available sounds for voice channels or search for sounds'
+    required_arguments = [Argument('page or query', optional=True, variadic=True)]
 
     async def execute(self) -> str:
-        """Respond with a list of available sounds for the `sound` command."""
-        response = "Available sounds:"
-        for key, value in CommandSound.sounds.items():
-            response += "\n  **{}**: <{}>".format(key, value['url'])
-
-        return response
+        """Respond with a page of available sounds for the `sound` command
+        or with the sounds that match a query."""
+        await library.refresh_async()
+        words = self.values['page or query']
+        if not words or (len(words) == 1 and words[0].isdigit()):
+            number = min(max(int(words[0]) if words else 1, 1), library.page_count())
+            response = 'Available sounds (page {} of {}):'.format(number, library.page_count())
+            page = library.page(number)
+            if page:
+                response += '\n' + page
+            return response
+
+        query = ' '.join(words)
+        names = await library.search_async(query)
+        if not names:
+            return 'No sounds found for "{}"'.format(query)
+
+        return 'Sounds matching "{}":\n{}'.format(query, '\n'.join(library.render(name) for name in names))
@@ -0,0 +1,62 @@
+"""A lightweight snapshot of a message for commands."""
+
+
+class MessageContext:
+    """The parts of a `discord.Message` commands need.
+
+    A context is created once per message and shared by all commands that handle
+    the message. Unlike a `discord.Message` it only holds plain values, so it's
+    small and can be pickled, e. g. to be sent to a worker process. Commands that
+    need live objects like servers or voice clients look them up with the client
+    using the IDs in the context.
+    """
+    __slots__ = (
+        'message_id', 'content', 'author_id', 'author_name', 'author_nick',
+        'channel_id', 'server_id', 'mention_ids', 'voice_channel_id',
+    )
+
+    def __init__(self, content='', message_id=None, author_id=None, author_name=None, author_nick=None,
+                 channel_id=None, server_id=None, mention_ids=(), voice_channel_id=None):
+        self.message_id = message_id
+        self.content = content
+        self.author_id = author_id
+        self.author_name = author_name
+        # The author's nickname on the server, if any
+        self.author_nick = author_nick
+        self.channel_id = channel_id
+        # None for private messages
+        self.server_id = server_id
+        self.mention_ids = tuple(mention_ids)
+        # The voice channel the author is connected to on the message's server
+        self.voice_channel_id = voice_channel_id
+
+    @classmethod
+    def from_message(cls, message):
+        author = message.author
+        voice = getattr(author, 'voice', None)
+        voice_channel = getattr(voice, 'voice_channel', None)
+
+        return cls(
+            content=message.content,
+            message_id=message.id,
+            author_id=author.id,
+            author_name=author.name,
+            author_nick=getattr(author, 'nick', None),
+            channel_id=message.channel.id if message.channel else None,
+            server_id=message.server.id if message.server else None,
+            mention_ids=[member.id for member in message.mentions],
+            voice_channel_id=voice_channel.id if voice_channel else None,
+        )
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, MessageContext) and self.__getstate__() == other.__getstate__()
+
+    def __repr__(self):
+        return 'MessageContext({})'.format(', '.join('{}={!r}'.format(*item) for item in self.__getstate__().items()))
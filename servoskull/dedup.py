@@ -0,0 +1,60 @@
+"""Suppress messages that Discord delivers more than once.
+
+After the gateway connection is resumed or re-established Discord can send
+`MESSAGE_CREATE` events the bot has already handled. Running the commands
+again would respond twice and repeat requests to upstream APIs.
+"""
+import time
+from collections import Counter, OrderedDict
+
+from servoskull.settings import DEDUP_SIZE, DEDUP_WINDOW
+
+# `duplicates` is the number of suppressed messages
+counters = Counter()
+
+
+class RecentMessages:
+    """A bounded set of the IDs of recently seen messages.
+
+    IDs are forgotten after `window` seconds or, if more than `size` messages
+    are seen within the window, oldest first. Checking an ID and expiring old
+    ones is O(1) on average.
+    """
+    def __init__(self, size=DEDUP_SIZE, window=DEDUP_WINDOW, clock=time.monotonic):
+        self.size = size
+        self.window = window
+        self.clock = clock
+        # Message IDs and when they were seen in insertion order
+        self._seen = OrderedDict()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __contains__(self, message_id):
+        return message_id in self._seen
+
+    def _expire(self, now):
+        while self._seen:
+            oldest = next(iter(self._seen.values()))
+            if now - oldest < self.window and len(self._seen) < self.size:
+                break
+            self._seen.popitem(last=False)
+
+    def remember(self, message_ids):
+        """Remember messages that were seen, e. g. by a previous process, as seen now."""
+        now = self.clock()
+        for message_id in message_ids:
+            self._seen[message_id] = now
+        self._expire(now)
+
+    def is_duplicate(self, message_id) -> bool:
+        """Return True if the message has already been seen, else remember it and return False."""
+        now = self.clock()
+        self._expire(now)
+
+        if message_id in self._seen:
+            counters['duplicates'] += 1
+            return True
+
+        self._seen[message_id] = now
+        return False
@@ -0,0 +1,241 @@
+"""Parse and roll dice expressions like `4d6kh3`, `10d10+5` or `3d6!`.
+
+An expression is a sum of terms. A term is either a number or `<count>d<sides>`
+followed by optional modifiers:
+
+    !    exploding dice: every die that shows its highest face adds another die
+    khN  keep the N highest dice
+    klN  keep the N lowest dice
+
+Parsed expressions are cached. Dice are rolled with NumPy. Without NumPy
+far fewer dice can be rolled at once. The number of dice and sides is limited
+so that a single roll can't take too long or use too much memory.
+"""
+import heapq
+import random
+import re
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from servoskull import ServoSkullError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Rolling dice in pure Python is roughly 50 times slower
+MAX_DICE = 1000000 if numpy is not None else 20000
+MAX_SIDES = 1000000
+MAX_TERMS = 20
+MAX_CONSTANT = 1000000
+# Valid expressions are shorter with the limits above (20 terms like `-1000000d1000000!kh1000000`)
+MAX_EXPRESSION_LENGTH = 600
+# How often exploding dice can explode in a row
+MAX_EXPLOSIONS = 100
+# Rolls with more dice than this are summarised instead of listing every die
+MAX_LISTED_DICE = 20
+# Rolls of dice with up to this many sides are summarised with a histogram
+MAX_HISTOGRAM_SIDES = 20
+# Discord rejects longer messages
+MAX_RESULT_LENGTH = 2000
+
+_TERM_REGEX = re.compile(r'([+-]?)(?:(\d*)d(\d+)(!?)(?:k([hl])(\d+))?|(\d+))')
+
+Dice = namedtuple('Dice', ['sign', 'count', 'sides', 'explode', 'keep', 'keep_count'])
+Constant = namedtuple('Constant', ['sign', 'value'])
+TermResult = namedtuple('TermResult', ['dice', 'rolls', 'kept', 'total'])
+
+
+class DiceError(ServoSkullError):
+    pass
+
+
+class Expression:
+    """A parsed dice expression."""
+    def __init__(self, text, terms):
+        self.text = text
+        self.terms = terms
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def dice_count(self):
+        return sum(term.count for term in self.terms if isinstance(term, Dice))
+
+    def is_single_die(self) -> bool:
+        """Return True if the expression is a single die without modifiers."""
+        return len(self.terms) == 1 and self.terms[0] == Dice(1, 1, self.terms[0].sides, False, None, None)
+
+    def roll(self):
+        """Roll the expression and return its total and the results of the dice terms."""
+        total = 0
+        results = []
+        for term in self.terms:
+            if isinstance(term, Constant):
+                total += term.sign * term.value
+            else:
+                result = _roll_dice(term)
+                results.append(result)
+                total += term.sign * result.total
+
+        return total, results
+
+
+def parse(text) -> Expression:
+    """Parse a dice expression or raise a `DiceError`.
+
+    A plain number `n` is a single n-sided die.
+    """
+    text = text.lower().replace(' ', '')
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise DiceError('Use at most {} characters'.format(MAX_EXPRESSION_LENGTH))
+    if text.isdigit():
+        text = '1d{}'.format(text)
+
+    return _parse(text)
+
+
+@lru_cache(maxsize=256)
+def _parse(text):
+    terms = []
+    position = 0
+    while position < len(text):
+        match = _TERM_REGEX.match(text, position)
+        if not match or (terms and not match.group(1)):
+            raise DiceError('Invalid dice expression "{}"'.format(text))
+        position = match.end()
+
+        sign = -1 if match.group(1) == '-' else 1
+        if match.group(7) is not None:
+            value = int(match.group(7))
+            if value > MAX_CONSTANT:
+                raise DiceError('Numbers must be at most {}'.format(MAX_CONSTANT))
+            terms.append(Constant(sign, value))
+            continue
+
+        count = int(match.group(2) or 1)
+        sides = int(match.group(3))
+        explode = bool(match.group(4))
+        keep = match.group(5)
+        keep_count = int(match.group(6)) if keep else None
+
+        if sides < 2 or sides > MAX_SIDES:
+            raise DiceError('Dice must have between 2 and {} sides'.format(MAX_SIDES))
+        if count < 1:
+            raise DiceError('Roll at least one die')
+        if keep and not 1 <= keep_count <= count:
+            raise DiceError('Keep between 1 and {} dice'.format(count))
+
+        terms.append(Dice(sign, count, sides, explode, keep, keep_count))
+
+    if not any(isinstance(term, Dice) for term in terms):
+        raise DiceError('Roll at least one die')
+    if len(terms) > MAX_TERMS:
+        raise DiceError('Use at most {} terms'.format(MAX_TERMS))
+
+    expression = Expression(text, tuple(terms))
+    if expression.dice_count > MAX_DICE:
+        raise DiceError('Roll at most {} dice'.format(MAX_DICE))
+
+    return expression
+
+
+def _roll(count, sides):
+    if numpy is not None:
+        return numpy.random.randint(1, sides + 1, size=count)
+    return [random.randint(1, sides) for _ in range(count)]
+
+
+def _roll_dice(dice):
+    rolls = _roll(dice.count, dice.sides)
+
+    if dice.explode:
+        new_rolls = rolls
+        for _ in range(MAX_EXPLOSIONS):
+            explosions = int((new_rolls == dice.sides).sum()) if numpy is not None else new_rolls.count(dice.sides)
+            explosions = min(explosions, MAX_DICE - len(rolls))
+            if explosions <= 0:
+                break
+            new_rolls = _roll(explosions, dice.sides)
+            rolls = numpy.concatenate([rolls, new_rolls]) if numpy is not None else rolls + new_rolls
+
+    kept = rolls
+    if dice.keep and numpy is not None:
+        kept = numpy.sort(rolls)
+        kept = kept[-dice.keep_count:] if dice.keep == 'h' else kept[:dice.keep_count]
+    elif dice.keep:
+        kept = (heapq.nlargest if dice.keep == 'h' else heapq.nsmallest)(dice.keep_count, rolls)
+
+    return TermResult(dice, rolls, kept, int(sum(kept)) if numpy is None else int(numpy.sum(kept, dtype='int64')))
+
+
+def _histogram(result):
+    if numpy is not None:
+        counts = numpy.bincount(result.rolls, minlength=result.dice.sides + 1)
+        return {face: int(counts[face]) for face in range(1, result.dice.sides + 1)}
+
+    counts = Counter(result.rolls)
+    return {face: counts[face] for face in range(1, result.dice.sides + 1)}
+
+
+def _summary(result):
+    if numpy is not None:
+        return int(numpy.min(result.rolls)), float(numpy.mean(result.rolls)), int(numpy.max(result.rolls))
+
+    return min(result.rolls), sum(result.rolls) / len(result.rolls), max(result.rolls)
+
+
+def _describe(result):
+    description = '{}d{}'.format(result.dice.count, result.dice.sides)
+    if len(result.rolls) <= MAX_LISTED_DICE:
+        rolls = sorted(int(roll) for roll in result.rolls)
+        kept = Counter(int(roll) for roll in result.kept)
+        shown = []
+        for roll in reversed(rolls):
+            if kept[roll]:
+                kept[roll] -= 1
+                shown.append(str(roll))
+            else:
+                shown.append('~~{}~~'.format(roll))
+        return '{}: {}'.format(description, ', '.join(shown))
+
+    if result.dice.sides <= MAX_HISTOGRAM_SIDES:
+        histogram = _histogram(result)
+        return '{} ({} dice): {}'.format(
+            description,
+            len(result.rolls),
+            ', '.join('{}: {}'.format(face, count) for face, count in histogram.items())
+        )
+
+    lowest, average, highest = _summary(result)
+    return '{} ({} dice): lowest {}, average {:.2f}, highest {}'.format(
+        description, len(result.rolls), lowest, average, highest
+    )
+
+
+def format_result(expression, total, results) -> str:
+    """Describe the result of a roll.
+
+    The individual dice are listed for small rolls. Larger rolls are
+    summarised with a histogram of the faces or the lowest, average and
+    highest roll. Terms that don't fit into `MAX_RESULT_LENGTH` are left out.
+    """
+    lines = ['Rolled {}: **{}**'.format(expression, total)]
+    # The expression's length is limited, so the first line always fits
+    length = len(lines[0])
+
+    for index, result in enumerate(results):
+        line = _describe(result)
+        omitted = '... and {} more'.format(len(results) - index)
+        # Leave room for the note about omitted terms unless this is the last term
+        reserved = len(omitted) + 1 if index < len(results) - 1 else 0
+        if length + len(line) + 1 + reserved > MAX_RESULT_LENGTH:
+            lines.append(omitted)
+            break
+
+        lines.append(line)
+        length += len(line) + 1
+
+    return '\n'.join(lines)
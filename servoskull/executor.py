@@ -0,0 +1,172 @@
+"""Execute commands in a thread or process pool instead of on the event loop.
+
+Commands that do CPU-heavy work would block the event loop and thus every
+other command. Such commands are registered with `execution=THREAD` or
+`execution=PROCESS` and implement the synchronous `run` method instead of
+`execute`. Only the arguments, the message context and the server configuration
+are sent to a process, the client is not available there.
+"""
+import asyncio
+import importlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from servoskull.settings import EXECUTOR_TIMEOUT, PROCESS_WORKERS, THREAD_WORKERS
+from servoskull.skulllogging import logger
+
+INLINE = 'inline'
+THREAD = 'thread'
+PROCESS = 'process'
+
+EXECUTIONS = (INLINE, THREAD, PROCESS)
+
+# `<execution>` is the number of executed commands per execution class,
+# `timeouts` the number of commands that took longer than the timeout,
+# `broken` the number of commands whose worker process died.
+counters = Counter()
+
+_pools = {}
+_semaphores = {}
+
+
+def _get_pool(execution):
+    if execution not in _pools:
+        if execution == THREAD:
+            _pools[execution] = ThreadPoolExecutor(max_workers=THREAD_WORKERS)
+        else:
+            _pools[execution] = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+
+    return _pools[execution]
+
+
+def _discard_pool(execution, pool=None):
+    """Shut down a pool so that the next command creates a new one.
+
+    If `pool` is given, the pool is only discarded if it's still in use."""
+    if execution in _pools and (pool is None or _pools[execution] is pool):
+        _pools.pop(execution).shutdown(wait=False)
+
+
+def _terminate_pool(pool):
+    """Discard a process pool and kill its workers, e. g. because a command is stuck.
+
+    Commands that were still running in the pool fail with `BrokenProcessPool`."""
+    # ProcessPoolExecutor has no public way to stop its workers
+    processes = list((getattr(pool, '_processes', None) or {}).values())
+    _discard_pool(PROCESS, pool)
+    for process in processes:
+        process.terminate()
+
+
+def reset_process_pool():
+    """Replace the process pool, e. g. after commands modules were reloaded,
+    so that the workers don't keep running the old versions of commands.
+    Running commands are finished by the old workers."""
+    _discard_pool(PROCESS)
+
+
+def _get_semaphore(loop, execution):
+    key = (loop, execution)
+    if key not in _semaphores:
+        # Limit the commands submitted to a pool to its number of workers
+        # so that excess commands wait here instead of in the pool's queue.
+        _semaphores[key] = asyncio.Semaphore(THREAD_WORKERS if execution == THREAD else PROCESS_WORKERS)
+
+    return _semaphores[key]
+
+
+def _run_in_process(module, name, kwargs):
+    """Create and run a command in a worker process."""
+    # The module may have been loaded at runtime, after the worker was started
+    return getattr(importlib.import_module(module), name)(**kwargs).run()
+
+
+def _submit(execution, command):
+    """Submit a command to its pool and return the pool and the future.
+
+    A pool that's broken, e. g. because a worker process was killed,
+    or that was shut down is replaced by a new one."""
+    if execution == THREAD:
+        work = (command.run,)
+    else:
+        kwargs = {
+            'arguments': command.arguments,
+            'values': command.values,
+            'context': command.context,
+            'config': command.config,
+        }
+        work = (_run_in_process, type(command).__module__, type(command).__name__, kwargs)
+
+    pool = _get_pool(execution)
+    try:
+        return pool, pool.submit(*work)
+    except RuntimeError as e:
+        logger.warning('Replacing the {} pool: {}'.format(execution, e))
+        _discard_pool(execution, pool)
+        pool = _get_pool(execution)
+        return pool, pool.submit(*work)
+
+
+def _release(loop, semaphore):
+    # The loop may have been closed while the command was still running
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(semaphore.release)
+
+
+def _timed_out(trigger):
+    counters['timeouts'] += 1
+    logger.warning('Command "{}" timed out after {}s'.format(trigger, EXECUTOR_TIMEOUT))
+    return 'Sorry, that took too long.'
+
+
+async def execute(trigger, command):
+    """Execute a command according to its execution class and return its response.
+
+    The timeout includes waiting for a free worker. Workers of the process pool
+    that run a command for longer than the timeout are killed. Threads can't be
+    killed, so a stuck command in the thread pool keeps its worker busy."""
+    execution = command.execution
+    counters[execution] += 1
+
+    if execution == INLINE:
+        return await command.execute()
+
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + EXECUTOR_TIMEOUT
+    semaphore = _get_semaphore(loop, execution)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), EXECUTOR_TIMEOUT)
+    except asyncio.TimeoutError:
+        return _timed_out(trigger)
+
+    try:
+        pool, future = _submit(execution, command)
+    except BaseException:
+        semaphore.release()
+        raise
+
+    # Release the semaphore only after the work has actually finished,
+    # even if we stop waiting for it because of the timeout.
+    future.add_done_callback(lambda _: _release(loop, semaphore))
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - loop.time(), 0))
+    except asyncio.TimeoutError:
+        if execution == PROCESS and not future.done():
+            # Free the worker. The semaphore is released when the future fails.
+            _terminate_pool(pool)
+        return _timed_out(trigger)
+    except BrokenProcessPool:
+        # A worker died while running the command, e. g. because it was killed
+        counters['broken'] += 1
+        logger.warning('The process pool broke while running command "{}"'.format(trigger))
+        _discard_pool(execution, pool)
+        return 'Sorry, something went wrong. Please try again.'
+
+
+def shutdown():
+    """Shut down all pools without waiting for running commands."""
+    for pool in _pools.values():
+        pool.shutdown(wait=False)
+    _pools.clear()
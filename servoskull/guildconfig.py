@@ -0,0 +1,117 @@
+"""Configuration of the bot per Discord server (guild).
+
+The configuration is stored in a SQLite database and cached in memory so that
+reading it for every message doesn't touch the database. Servers without a
+stored configuration use the defaults from `servoskull.settings`.
+"""
+import json
+import sqlite3
+
+from servoskull.settings import AUTOGIF, CMD_PREFIX, DATABASE
+from servoskull.skulllogging import logger
+
+
+class GuildConfig:
+    """The immutable configuration of a single server.
+
+    All commands are enabled unless they are in `disabled_commands` or
+    `disabled_passive_commands`.
+    """
+    __slots__ = ('prefix', 'autogif', 'disabled_commands', 'disabled_passive_commands')
+
+    def __init__(self, prefix=CMD_PREFIX, autogif=AUTOGIF, disabled_commands=(), disabled_passive_commands=()):
+        self.prefix = prefix
+        self.autogif = autogif
+        self.disabled_commands = frozenset(disabled_commands)
+        self.disabled_passive_commands = frozenset(disabled_passive_commands)
+
+    def replace(self, **changes):
+        """Return a copy of the configuration with some values changed."""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return GuildConfig(**values)
+
+
+DEFAULT_CONFIG = GuildConfig()
+
+
+class GuildConfigStore:
+    """Reads configurations from and writes them to a SQLite database.
+
+    The database is opened when a configuration is read the first time.
+    """
+    def __init__(self, path=DATABASE):
+        self.path = path
+        self._connection = None
+        self._cache = {}
+
+    def _connect(self):
+        if self._connection is None:
+            logger.debug('Opening guild configuration database {}'.format(self.path))
+            self._connection = sqlite3.connect(self.path)
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS guild_config ('
+                    'guild_id TEXT PRIMARY KEY, '
+                    'prefix TEXT NOT NULL, '
+                    'autogif INTEGER NOT NULL, '
+                    'disabled_commands TEXT NOT NULL, '
+                    'disabled_passive_commands TEXT NOT NULL)'
+                )
+
+        return self._connection
+
+    def get(self, guild_id) -> GuildConfig:
+        """Return the configuration of a server or the default configuration
+        if `guild_id` is None (e. g. for private messages)."""
+        if guild_id is None:
+            return DEFAULT_CONFIG
+
+        try:
+            return self._cache[guild_id]
+        except KeyError:
+            pass
+
+        row = self._connect().execute(
+            'SELECT prefix, autogif, disabled_commands, disabled_passive_commands '
+            'FROM guild_config WHERE guild_id = ?',
+            (guild_id,)
+        ).fetchone()
+
+        if row is None:
+            config = DEFAULT_CONFIG
+        else:
+            config = GuildConfig(
+                prefix=row[0],
+                autogif=bool(row[1]),
+                disabled_commands=json.loads(row[2]),
+                disabled_passive_commands=json.loads(row[3]),
+            )
+
+        self._cache[guild_id] = config
+        return config
+
+    def update(self, guild_id, **changes) -> GuildConfig:
+        """Change some values of a server's configuration and return the new configuration."""
+        config = self.get(guild_id).replace(**changes)
+
+        with self._connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO guild_config '
+                '(guild_id, prefix, autogif, disabled_commands, disabled_passive_commands) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (
+                    guild_id,
+                    config.prefix,
+                    int(config.autogif),
+                    json.dumps(sorted(config.disabled_commands)),
+                    json.dumps(sorted(config.disabled_passive_commands)),
+                )
+            )
+
+        self._cache[guild_id] = config
+        logger.info('Updated configuration of server {}'.format(guild_id))
+        return config
+
+
+store = GuildConfigStore()
@@ -0,0 +1,269 @@
+"""Persist the gateway session so that a restarted bot can resume it.
+
+Identifying as a new session means waiting for Discord to send every server
+and being subject to the identify rate limit. Resuming a session only replays
+the events that were missed. A resumed session doesn't receive the READY and
+GUILD_CREATE events that discord.py builds its cache of servers and channels
+from, so those are saved as well and replayed before resuming. They are kept
+up to date with the events that change servers, members, roles, channels and
+voice states so that the replayed cache is current. Presences aren't kept
+because they change too often to be worth it.
+"""
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from servoskull.settings import SESSION_FILE, SESSION_MAX_AGE
+from servoskull.skulllogging import logger
+
+# `resumes` and `identifies` count how sessions were started,
+# `resume_failures` how often resuming failed and the bot had to identify,
+# `restore_failures` how often the saved session couldn't be loaded into the cache.
+counters = Counter()
+
+
+def load(path=SESSION_FILE, max_age=SESSION_MAX_AGE):
+    """Return the saved session or None if there is none or it's too old to be resumed."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            saved = json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning('Could not read session file {}: {}'.format(path, e))
+        return None
+
+    try:
+        age = time.time() - saved['saved_at']
+        if age > max_age:
+            logger.info('Not resuming session saved {:.0f}s ago'.format(age))
+            return None
+        if not saved['session_id'] or saved['sequence'] is None or not saved['payloads']:
+            return None
+    except (KeyError, TypeError):
+        logger.warning('Invalid session file {}'.format(path))
+        return None
+
+    return saved
+
+
+def save(session_id, sequence, payloads, path=SESSION_FILE):
+    """Save a session.
+
+    payloads: The READY and GUILD_CREATE gateway messages of the session.
+    """
+    data = {
+        'session_id': session_id,
+        'sequence': sequence,
+        'saved_at': time.time(),
+        'payloads': payloads,
+    }
+
+    # Write to a temporary file first so that a crash doesn't leave a broken file
+    temporary_path = '{}.tmp'.format(path)
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(temporary_path, path)
+
+
+def clear(path=SESSION_FILE):
+    """Delete the saved session and the IDs of the messages received after it was saved."""
+    for file_path in [path, _message_ids_path(path)]:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def _message_ids_path(path):
+    return '{}.messages'.format(path)
+
+
+def load_message_ids(path=SESSION_FILE) -> list:
+    """Return the IDs of the messages received after the session was saved.
+
+    Discord sends these messages again when the session is resumed."""
+    try:
+        with open(_message_ids_path(path), encoding='utf-8') as file:
+            return file.read().split()
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        logger.warning('Could not read received message IDs: {}'.format(e))
+        return []
+
+
+def _replace(items, item, key='id'):
+    """Replace the item with the same key in a list or append it."""
+    items[:] = [existing for existing in items if existing[key] != item[key]]
+    items.append(item)
+
+
+def _remove(items, value, key='id'):
+    items[:] = [existing for existing in items if existing[key] != value]
+
+
+def _remove_member(members, user_id):
+    members[:] = [member for member in members if member['user']['id'] != user_id]
+
+
+class Snapshot:
+    """The READY and GUILD_CREATE data of a session, updated with later events."""
+    EVENTS = {
+        'READY', 'USER_UPDATE', 'GUILD_CREATE', 'GUILD_UPDATE', 'GUILD_DELETE', 'GUILD_EMOJIS_UPDATE',
+        'GUILD_MEMBER_ADD', 'GUILD_MEMBER_REMOVE', 'GUILD_MEMBER_UPDATE', 'GUILD_MEMBERS_CHUNK',
+        'GUILD_ROLE_CREATE', 'GUILD_ROLE_UPDATE', 'GUILD_ROLE_DELETE',
+        'CHANNEL_CREATE', 'CHANNEL_UPDATE', 'CHANNEL_DELETE', 'VOICE_STATE_UPDATE',
+    }
+
+    def __init__(self):
+        self.ready = None
+        self.guilds = OrderedDict()
+
+    def payloads(self) -> list:
+        """Return the READY and GUILD_CREATE messages that recreate the current state."""
+        if self.ready is None:
+            return []
+
+        payloads = [{'op': 0, 't': 'READY', 'd': self.ready}]
+        payloads.extend({'op': 0, 't': 'GUILD_CREATE', 'd': guild} for guild in self.guilds.values())
+        return payloads
+
+    def apply(self, event, data):
+        """Update the snapshot with the data of a gateway event. Other events are ignored."""
+        if event == 'READY':
+            self.ready = data
+            self.guilds = OrderedDict()
+            return
+        if self.ready is None:
+            return
+
+        if event == 'USER_UPDATE':
+            self.ready['user'] = data
+        elif event == 'GUILD_CREATE':
+            data.pop('presences', None)
+            self.guilds[data['id']] = data
+        elif event == 'GUILD_DELETE':
+            self.guilds.pop(data['id'], None)
+            _remove(self.ready.get('guilds', []), data['id'])
+        elif event.startswith('CHANNEL_') and 'guild_id' not in data:
+            # A private channel
+            private_channels = self.ready.setdefault('private_channels', [])
+            if event == 'CHANNEL_DELETE':
+                _remove(private_channels, data['id'])
+            else:
+                _replace(private_channels, data)
+        else:
+            guild = self.guilds.get(data.get('guild_id', data.get('id')))
+            if guild is not None:
+                self._apply_to_guild(guild, event, data)
+
+    @staticmethod
+    def _apply_to_guild(guild, event, data):
+        members = guild.setdefault('members', [])
+
+        if event == 'GUILD_UPDATE':
+            guild.update(data)
+        elif event == 'GUILD_EMOJIS_UPDATE':
+            guild['emojis'] = data['emojis']
+        elif event == 'GUILD_MEMBER_ADD':
+            _remove_member(members, data['user']['id'])
+            members.append(data)
+            guild['member_count'] = guild.get('member_count', 0) + 1
+        elif event == 'GUILD_MEMBER_REMOVE':
+            _remove_member(members, data['user']['id'])
+            guild['member_count'] = max(guild.get('member_count', 1) - 1, 0)
+        elif event == 'GUILD_MEMBER_UPDATE':
+            for member in members:
+                if member['user']['id'] == data['user']['id']:
+                    member.update(user=data['user'], roles=data['roles'], nick=data.get('nick'))
+        elif event == 'GUILD_MEMBERS_CHUNK':
+            known = {member['user']['id'] for member in members}
+            members.extend(member for member in data['members'] if member['user']['id'] not in known)
+        elif event in ('GUILD_ROLE_CREATE', 'GUILD_ROLE_UPDATE'):
+            _replace(guild.setdefault('roles', []), data['role'])
+        elif event == 'GUILD_ROLE_DELETE':
+            _remove(guild.setdefault('roles', []), data['role_id'])
+        elif event in ('CHANNEL_CREATE', 'CHANNEL_UPDATE'):
+            _replace(guild.setdefault('channels', []), data)
+        elif event == 'CHANNEL_DELETE':
+            _remove(guild.setdefault('channels', []), data['id'])
+        elif event == 'VOICE_STATE_UPDATE':
+            voice_states = guild.setdefault('voice_states', [])
+            _remove(voice_states, data['user_id'], key='user_id')
+            if data.get('channel_id'):
+                voice_states.append(data)
+
+
+class Recorder:
+    """Keep a `Snapshot` of the current session up to date and save it.
+
+    discord.py changes the data of events while parsing them, so events are
+    serialised as soon as they're recorded. Updating the snapshot and saving
+    it happens in a single worker thread, in the order of the events, so
+    neither blocks the event loop.
+
+    The IDs of messages received after the session was saved are appended to
+    a second file, so that a resumed session can ignore the messages Discord
+    sends again even if the bot wasn't shut down cleanly.
+    """
+    def __init__(self, path=SESSION_FILE):
+        self.path = path
+        self.snapshot = Snapshot()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._message_ids_file = None
+
+    def record(self, event, data):
+        """Record a gateway event if it changes the snapshot or is a message."""
+        if event in Snapshot.EVENTS:
+            self._executor.submit(self._apply, event, json.dumps(data))
+        elif event == 'MESSAGE_CREATE' and self.path:
+            self._executor.submit(self._append_message_id, data['id'])
+
+    def _append_message_id(self, message_id):
+        try:
+            if self._message_ids_file is None:
+                self._message_ids_file = open(_message_ids_path(self.path), 'a', encoding='utf-8')
+            self._message_ids_file.write('{}\n'.format(message_id))
+            # A crashing process loses what's still in its buffers
+            self._message_ids_file.flush()
+        except OSError as e:
+            logger.warning('Could not save received message ID: {}'.format(e))
+
+    def _clear_message_ids(self):
+        if self._message_ids_file is not None:
+            self._message_ids_file.close()
+            self._message_ids_file = None
+        try:
+            os.remove(_message_ids_path(self.path))
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, event, data):
+        try:
+            self.snapshot.apply(event, json.loads(data))
+        except (KeyError, TypeError, AttributeError) as e:
+            logger.warning('Could not apply {} event to the session snapshot: {!r}'.format(event, e))
+
+    def save(self, session_id, sequence):
+        """Save the snapshot after all events recorded so far were applied.
+
+        Returns a `concurrent.futures.Future` that's True if the session was saved."""
+        return self._executor.submit(self._save, session_id, sequence)
+
+    def _save(self, session_id, sequence):
+        payloads = self.snapshot.payloads()
+        if not payloads:
+            return False
+
+        try:
+            save(session_id, sequence, payloads, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning('Could not save the gateway session: {}'.format(e))
+            return False
+
+        # Messages received before the saved sequence number aren't sent again
+        self._clear_message_ids()
+        return True
@@ -5,6 +5,18 @@ ENV_PREFIX = 'SERVOSKULL_CMD_PREFIX'
 ENV_USE_AVCONV = 'SERVOSKULL_AVCONV'
 ENV_LOGLEVEL = 'SERVOSKULL_LOGLEVEL'
 ENV_AUTOGIF = 'SERVOSKULL_AUTOGIF'
+ENV_STALL_THRESHOLD = 'SERVOSKULL_STALL_THRESHOLD'
+ENV_OWNER_ID = 'SERVOSKULL_OWNER_ID'
+ENV_AUTORELOAD = 'SERVOSKULL_AUTORELOAD'
+ENV_DEDUP_WINDOW = 'SERVOSKULL_DEDUP_WINDOW'
+ENV_DEDUP_SIZE = 'SERVOSKULL_DEDUP_SIZE'
+ENV_DATABASE = 'SERVOSKULL_DATABASE'
+ENV_THREAD_WORKERS = 'SERVOSKULL_THREAD_WORKERS'
+ENV_PROCESS_WORKERS = 'SERVOSKULL_PROCESS_WORKERS'
+ENV_EXECUTOR_TIMEOUT = 'SERVOSKULL_EXECUTOR_TIMEOUT'
+ENV_SOUNDS_DIRECTORY = 'SERVOSKULL_SOUNDS_DIRECTORY'
+ENV_SESSION_FILE = 'SERVOSKULL_SESSION_FILE'
+ENV_SESSION_MAX_AGE = 'SERVOSKULL_SESSION_MAX_AGE'
 
 DISCORD_TOKEN = os.getenv(ENV_TOKEN, None)
 CMD_PREFIX = os.getenv(ENV_PREFIX, '!')
@@ -20,3 +32,40 @@ LOGGING_LEVEL = os.getenv(ENV_LOGLEVEL, 'DEBUG')
 # if it can't find the originally requested command in addition to the normal "couldn't
 # find that command" response.
 AUTOGIF = True if os.getenv(ENV_AUTOGIF) else False
+
+# Seconds the event loop may be blocked before the watchdog logs a stall together
+# with the stack of the blocking code. Set to 0 to disable the watchdog.
+STALL_THRESHOLD = float(os.getenv(ENV_STALL_THRESHOLD, '0.5'))
+
+# The Discord user ID of the bot's owner. Only the owner can use owner commands
+# like `reload`. If not set, nobody can use them.
+OWNER_ID = os.getenv(ENV_OWNER_ID, None)
+
+# If enabled, commands modules are reloaded automatically when their source files change.
+AUTORELOAD = True if os.getenv(ENV_AUTORELOAD) else False
+
+# Discord can deliver a message again after the gateway connection was resumed.
+# The IDs of handled messages are remembered for this many seconds, but at most
+# for this many messages, so that duplicates are ignored.
+DEDUP_WINDOW = float(os.getenv(ENV_DEDUP_WINDOW, '300'))
+DEDUP_SIZE = int(os.getenv(ENV_DEDUP_SIZE, '10000'))
+
+# Path of the SQLite database that stores the configuration of each server
+DATABASE = os.getenv(ENV_DATABASE, 'servoskull.sqlite3')
+
+# Number of threads and processes for commands that don't run on the event loop
+# and the number of seconds after which the bot stops waiting for them.
+THREAD_WORKERS = int(os.getenv(ENV_THREAD_WORKERS, '4'))
+PROCESS_WORKERS = int(os.getenv(ENV_PROCESS_WORKERS, str(os.cpu_count() or 1)))
+EXECUTOR_TIMEOUT = float(os.getenv(ENV_EXECUTOR_TIMEOUT, '10'))
+
+# Directory containing the JSON manifests of sounds for the `sound` command
+SOUNDS_DIRECTORY = os.getenv(ENV_SOUNDS_DIRECTORY, os.path.join(os.path.dirname(__file__), 'sounds'))
+
+# The gateway session is saved to this file on shutdown and regularly while the bot
+# is running so that it can be resumed after a restart. Sessions older than
+# SESSION_MAX_AGE seconds aren't resumed. Set SESSION_FILE to an empty string to
+# always start a new session.
+SESSION_FILE = os.getenv(ENV_SESSION_FILE, 'session.json')
+SESSION_MAX_AGE = float(os.getenv(ENV_SESSION_MAX_AGE, '300'))
+SESSION_SAVE_INTERVAL = 30
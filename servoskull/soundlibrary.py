@@ -0,0 +1,254 @@
+"""The library of sounds the bot can play in voice channels.
+
+Sounds are defined in JSON manifests in a directory. Each manifest maps
+sound names to their URL, volume and optional tags:
+
+    {
+        "horn": {"url": "https://www.youtube.com/watch?v=9Jz1TjCphXE", "volume": 0.1, "tags": ["loud"]}
+    }
+
+The library only keeps an index of the names and tags of the sounds in memory.
+URLs and volumes are read from the manifest when a sound is played.
+The index is built the first time it's used and updated when a manifest is
+added, changed or removed, so no restart is required. Only changed manifests
+are read again.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from difflib import get_close_matches
+
+from servoskull.settings import SOUNDS_DIRECTORY
+from servoskull.skulllogging import logger
+
+# names: sorted names of all sounds
+# sounds: the manifest filename and tags of each sound by name
+# tags: sorted names of sounds by tag
+# pages: rendered pages of the sound list by page number
+Index = namedtuple('Index', ['names', 'sounds', 'tags', 'pages'])
+
+
+class Sound:
+    __slots__ = ('name', 'url', 'volume', 'tags')
+
+    def __init__(self, name, url, volume=1.0, tags=()):
+        self.name = name
+        self.url = url
+        self.volume = volume
+        self.tags = tuple(tags)
+
+
+class SoundLibrary:
+    """An index of the sounds in a directory of manifests.
+
+    Names are kept sorted for prefix searches and tags are mapped to the
+    names of their sounds so that searching doesn't have to look at every sound.
+
+    Reading the manifests and finding similar names blocks, so commands should
+    update the index with `refresh_async` and use `get_async` and `search_async`.
+    The index is replaced as a whole, so it can be used while it's being updated
+    in a thread.
+    """
+    page_size = 20
+
+    def __init__(self, directory=SOUNDS_DIRECTORY, refresh_interval=10, clock=time.monotonic):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+
+        self._index = None
+        # The modification time, size and sounds of each manifest the index was built from
+        self._manifests = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _read_manifest(self, filename):
+        """Return the sounds of a manifest by their lowercase name or None if it can't be read.
+
+        Each sound is a dict with its URL, volume and lowercase tags. Invalid sounds are skipped."""
+        path = os.path.join(self.directory, filename)
+        try:
+            with open(path, encoding='utf-8') as file:
+                manifest = json.load(file)
+            items = list(manifest.items())
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning('Could not load sound manifest {}: {}'.format(path, e))
+            return None
+
+        sounds = {}
+        for name, sound in items:
+            try:
+                url = sound['url']
+                volume = sound.get('volume', 1.0)
+                tags = sound.get('tags', [])
+                if not isinstance(url, str) or not url:
+                    raise ValueError('invalid URL')
+                if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                    raise ValueError('tags must be a list of strings')
+            except (KeyError, TypeError, AttributeError, ValueError) as e:
+                logger.warning('Skipping sound "{}" in manifest {}: {}'.format(name, path, e))
+                continue
+
+            sounds[name.lower()] = {'url': url, 'volume': volume, 'tags': tuple(tag.lower() for tag in tags)}
+
+        return sounds
+
+    def _stat_manifests(self):
+        try:
+            filenames = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        except OSError as e:
+            logger.warning('Could not read sounds directory {}: {}'.format(self.directory, e))
+            return {}
+
+        stats = {}
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError as e:
+                # E. g. the manifest was removed in the meantime
+                logger.warning('Could not read sound manifest {}: {}'.format(filename, e))
+                continue
+            stats[filename] = (stat.st_mtime, stat.st_size)
+
+        return stats
+
+    def refresh(self, force=False):
+        """Update the index if the manifests changed. The directory is only
+        checked once per `refresh_interval` seconds unless `force` is True.
+
+        This blocks while manifests are read, see `refresh_async`."""
+        with self._lock:
+            now = self.clock()
+            if not force and self._index is not None and now - self._checked_at < self.refresh_interval:
+                return
+
+            self._checked_at = now
+            stats = self._stat_manifests()
+            if self._index is not None and stats == {name: stat for name, (stat, _) in self._manifests.items()}:
+                return
+
+            manifests = {}
+            for filename, stat in stats.items():
+                if filename in self._manifests and self._manifests[filename][0] == stat:
+                    manifests[filename] = self._manifests[filename]
+                    continue
+
+                sounds = self._read_manifest(filename) or {}
+                manifests[filename] = (stat, {name: sound['tags'] for name, sound in sounds.items()})
+
+            self._manifests = manifests
+            self._index = self._build_index(manifests)
+            logger.info('Loaded {} sounds from {}'.format(len(self._index.names), self.directory))
+
+    @staticmethod
+    def _build_index(manifests):
+        sounds = {}
+        for filename in sorted(manifests):
+            for name, tags in manifests[filename][1].items():
+                sounds[name] = (filename, tags)
+
+        tags = {}
+        for name, (_, sound_tags) in sounds.items():
+            for tag in sound_tags:
+                tags.setdefault(tag, []).append(name)
+
+        return Index(sorted(sounds), sounds, {tag: sorted(names) for tag, names in tags.items()}, {})
+
+    async def refresh_async(self, loop=None):
+        """Update the index in a thread if it's due."""
+        if self._index is not None and self.clock() - self._checked_at < self.refresh_interval:
+            return
+
+        loop = loop or asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.refresh)
+
+    def _get_index(self):
+        if self._index is None:
+            self.refresh()
+        return self._index
+
+    def __len__(self):
+        return len(self._get_index().names)
+
+    def get(self, name):
+        """Return the sound with the name or None.
+
+        This blocks while the sound's manifest is read, see `get_async`."""
+        name = name.lower()
+        entry = self._get_index().sounds.get(name)
+        if entry is None:
+            return None
+
+        sound = (self._read_manifest(entry[0]) or {}).get(name)
+        if sound is None:
+            return None
+
+        return Sound(name, sound['url'], sound['volume'], sound['tags'])
+
+    async def get_async(self, name, loop=None):
+        """Return the sound with the name or None without blocking the event loop."""
+        await self.refresh_async(loop)
+        loop = loop or asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.get, name)
+
+    def search(self, query, limit=None) -> list:
+        """Return the names of sounds matching a query.
+
+        Sounds whose names start with the query come first, followed by sounds
+        with a tag equal to the query. If there are none, similar names are returned.
+        """
+        index = self._get_index()
+        query = query.lower()
+        limit = limit or self.page_size
+
+        results = []
+        position = bisect_left(index.names, query)
+        while position < len(index.names) and index.names[position].startswith(query) and len(results) < limit:
+            results.append(index.names[position])
+            position += 1
+
+        for name in index.tags.get(query, []):
+            if len(results) >= limit:
+                break
+            if name not in results:
+                results.append(name)
+
+        if not results:
+            results = get_close_matches(query, index.names, limit)
+
+        return results
+
+    async def search_async(self, query, limit=None, loop=None) -> list:
+        """Search for sounds without blocking the event loop.
+
+        Finding similar names takes longer the more sounds there are."""
+        await self.refresh_async(loop)
+        loop = loop or asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.search, query, limit)
+
+    def page_count(self) -> int:
+        return max(1, -(-len(self) // self.page_size))
+
+    def page(self, number) -> str:
+        """Return a rendered page of the list of sounds. Page numbers start at 1."""
+        index = self._get_index()
+        if number not in index.pages:
+            start = (number - 1) * self.page_size
+            names = index.names[start:start + self.page_size]
+            index.pages[number] = '\n'.join(self.render(name) for name in names)
+
+        return index.pages[number]
+
+    def render(self, name) -> str:
+        """Return a line describing a sound."""
+        tags = self._get_index().sounds[name][1]
+        if tags:
+            return '  **{}** ({})'.format(name, ', '.join(tags))
+        return '  **{}**'.format(name)
+
+
+library = SoundLibrary()
@@ -0,0 +1,107 @@
+"""A watchdog thread that detects when the event loop is blocked.
+
+Every command runs on the same event loop so a single blocking call freezes
+the whole bot and, if it takes long enough, makes Discord drop the connection
+because heartbeats can't be sent. The watchdog regularly schedules a callback
+on the loop and, if it doesn't run within the threshold, logs the stack of
+the loop's thread and the command that was being executed at the time.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from servoskull.settings import STALL_THRESHOLD
+from servoskull.skulllogging import logger
+
+# Stall statistics. `stalls` is the total number of detected stalls,
+# `stall_seconds` the total time the loop was blocked and `stalls:<label>`
+# the number of stalls attributed to a command.
+counters = Counter()
+
+# Maps running tasks to a label of the command they are executing
+_in_flight = {}
+
+_watchdog = None
+
+
+def _current_task(loop):
+    try:
+        return asyncio.current_task(loop)
+    except AttributeError:
+        # Python < 3.7
+        return asyncio.Task.current_task(loop)
+
+
+@contextmanager
+def attribute(label):
+    """Attribute stalls that happen in the current task to `label`
+    while the block is executed."""
+    task = _current_task(asyncio.get_event_loop())
+    previous = _in_flight.get(task)
+    _in_flight[task] = label
+    try:
+        yield
+    finally:
+        if previous is None:
+            _in_flight.pop(task, None)
+        else:
+            _in_flight[task] = previous
+
+
+class Watchdog(threading.Thread):
+    """Thread that measures how long the event loop takes to run a callback.
+
+    Must be created in the thread that runs the event loop.
+    """
+    def __init__(self, loop, threshold=STALL_THRESHOLD):
+        super().__init__(name='servoskull-watchdog', daemon=True)
+        self.loop = loop
+        self.threshold = threshold
+        self.loop_thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.threshold):
+            self._probe()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _probe(self):
+        pong = threading.Event()
+        sent = time.monotonic()
+        self.loop.call_soon_threadsafe(pong.set)
+        if pong.wait(self.threshold):
+            return
+
+        label = _in_flight.get(_current_task(self.loop), 'unknown')
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = ''.join(traceback.format_stack(frame)) if frame else ''
+        logger.warning('Event loop blocked for more than {}s by {}:\n{}'.format(self.threshold, label, stack))
+
+        while not pong.wait(self.threshold):
+            if self._stopped.is_set():
+                return
+
+        duration = time.monotonic() - sent
+        counters['stalls'] += 1
+        counters['stall_seconds'] += duration
+        counters['stalls:{}'.format(label)] += 1
+        logger.warning('Event loop was blocked for {:.2f}s by {}'.format(duration, label))
+
+
+def start(loop):
+    """Start watching `loop` unless the watchdog is disabled or already running."""
+    global _watchdog
+
+    if STALL_THRESHOLD <= 0 or _watchdog is not None:
+        return _watchdog
+
+    _watchdog = Watchdog(loop)
+    _watchdog.start()
+    logger.debug('Started event loop watchdog with a threshold of {}s'.format(STALL_THRESHOLD))
+    return _watchdog
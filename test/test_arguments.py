@@ -0,0 +1,45 @@
+import pytest
+
+from servoskull import ServoSkullError
+from servoskull.commands.arguments import Argument, ArgumentError, Integer, Mention, Schema, tokenize
+
+
+def test_tokenize():
+    assert tokenize('') == []
+    assert tokenize('one  two\tthree') == ['one', 'two', 'three']
+    assert tokenize('one "two three" four') == ['one', 'two three', 'four']
+    assert tokenize('"" don\'t') == ['', "don't"]
+
+
+def test_schema_parse():
+    schema = Schema([Integer('n', minimum=2, maximum=10), Mention('user', optional=True)])
+
+    assert schema.parse(['5']) == {'n': 5, 'user': None}
+    assert schema.parse(['5', '<@!278126797306986496>', 'extra']) == {'n': 5, 'user': '278126797306986496'}
+
+    for words in [[], ['1'], ['11'], ['bla']]:
+        with pytest.raises(ArgumentError):
+            schema.parse(words)
+
+    with pytest.raises(ArgumentError):
+        schema.parse(['5', 'somebody'])
+
+
+def test_schema_variadic():
+    schema = Schema([Argument('first'), Argument('rest', variadic=True)])
+    assert schema.parse(['a', 'b', 'c']) == {'first': 'a', 'rest': ['b', 'c']}
+
+    with pytest.raises(ArgumentError):
+        schema.parse(['a'])
+
+    schema = Schema([Argument('rest', optional=True, variadic=True)])
+    assert schema.parse([]) == {'rest': []}
+    assert schema.usage() == '**[rest...]**'
+
+
+def test_invalid_schema():
+    with pytest.raises(ServoSkullError):
+        Schema([Argument('rest', variadic=True), Argument('last')])
+
+    with pytest.raises(ServoSkullError):
+        Schema([Argument('optional', optional=True), Argument('required')])
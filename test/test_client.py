@@ -1,6 +1,78 @@
-def test_get_by_command_prefix():
-    from servoskull import client
+from itertools import count
+
+import pytest
+
+from servoskull import client, guildconfig
+from servoskull.commands import meta, registry
+from servoskull.commands.arguments import Integer
+from servoskull.commands.passive import PassiveCommand
+from servoskull.commands.regular import Command
+from servoskull.context import MessageContext
+from servoskull.guildconfig import DEFAULT_CONFIG
+from util import DottedDict
+
+
+class SentMessages(list):
+    """Replaces `client.send_message` and keeps the contents of the sent messages."""
+    async def __call__(self, channel, content=None, embed=None):
+        self.append(content or embed)
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages = SentMessages()
+    monkeypatch.setattr(client.client, 'send_message', messages)
+    return messages
+
+
+class FakeStore:
+    """A `GuildConfigStore` that doesn't use a database."""
+    def __init__(self, **configs):
+        self.configs = configs
+
+    def get(self, guild_id):
+        return self.configs.get(guild_id, DEFAULT_CONFIG)
+
+    def update(self, guild_id, **changes):
+        self.configs[guild_id] = self.get(guild_id).replace(**changes)
+        return self.configs[guild_id]
+
+
+class PassiveTestCommand(PassiveCommand):
+    triggered = []
+
+    def is_triggered(self):
+        return 'passivetest' in self.context.content
+
+    async def execute(self):
+        self.triggered.append(self.context.server_id)
+
 
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(guildconfig, 'store', store)
+    monkeypatch.setattr(meta, 'store', store)
+    monkeypatch.setattr(client.client.connection, 'user', DottedDict(id='99', mentioned_in=lambda message: False))
+    monkeypatch.setattr(client, 'OWNER_ID', '2')
+
+    registry.register('Passive test', passive=True)(PassiveTestCommand)
+    PassiveTestCommand.triggered = []
+    yield store
+    registry.unregister('Passive test')
+
+
+message_ids = count()
+
+
+def make_message(content, server_id='1'):
+    return DottedDict(
+        id=str(next(message_ids)), content=content, author=DottedDict(id='2', name='user'),
+        channel=DottedDict(id='3'), server=DottedDict(id=server_id), mentions=[], mention_everyone=False,
+    )
+
+
+def test_get_by_command_prefix():
     string = '!test arg1 arg2 arg3 !asdf'
 
     command, arguments = client.get_command_by_prefix(string)
@@ -15,10 +87,15 @@ def test_get_by_command_prefix():
     assert command == 'test'
     assert arguments == ['<@!278126797306986496>', 'arg1', 'arg2', 'arg3', '!asdf']
 
+    string = '!test "quoted arg1" arg2'
 
-def test_get_command_by_mention():
-    from servoskull import client
+    command, arguments = client.get_command_by_prefix(string)
+
+    assert command == 'test'
+    assert arguments == ['quoted arg1', 'arg2']
 
+
+def test_get_command_by_mention():
     string = '<@!278126797306986496> test arg1 arg2 arg3 <@!278126797306986497>'
 
     command, arguments = client.get_command_by_mention(string, '278126797306986496')
@@ -28,7 +105,108 @@ def test_get_command_by_mention():
 
 
 def test_get_closest_command():
-    from servoskull import client
-
     assert client.get_closest_command('yeno') == 'yesno'
-    assert client.get_closest_command('blabla') is None
\ No newline at end of file
+    assert client.get_closest_command('blabla') is None
+
+
+@pytest.mark.asyncio
+async def test_execute_unknown_command_without_gif(sent, monkeypatch):
+    # The gif command's module can be unloaded
+    monkeypatch.delitem(registry.commands, 'gif')
+    monkeypatch.delitem(registry.get_active_commands(), 'gif')
+    message = make_message('!nosuchcommand')
+
+    await client.execute_command('nosuchcommand', [], message, MessageContext.from_message(message),
+                                 DEFAULT_CONFIG.replace(autogif=True))
+
+    assert sent[0].startswith('No such command "nosuchcommand".')
+
+
+
+@pytest.mark.asyncio
+async def test_server_prefix(sent, store):
+    store.update('1', prefix='#')
+
+    await client.on_message(make_message('!yesno', server_id='1'))
+    assert sent == []
+
+    await client.on_message(make_message('#yesno', server_id='1'))
+    await client.on_message(make_message('!yesno', server_id='2'))
+    assert len(sent) == 2
+    assert all(response in ['yes', 'no'] for response in sent)
+
+
+@pytest.mark.asyncio
+async def test_server_disabled_commands(sent, store):
+    store.update('1', disabled_commands={'yesno'}, disabled_passive_commands={'Passive test'})
+
+    await client.on_message(make_message('!yesno passivetest', server_id='1'))
+    assert sent == ['The command "yesno" is disabled on this server.']
+    assert PassiveTestCommand.triggered == []
+
+    await client.on_message(make_message('!yesno passivetest', server_id='2'))
+    assert sent[1] in ['yes', 'no']
+    assert PassiveTestCommand.triggered == ['2']
+
+
+@pytest.mark.asyncio
+async def test_config_command_changes_configuration_live(sent, store):
+    await client.on_message(make_message('!config prefix #'))
+    assert sent[-1].startswith('Configuration updated.')
+
+    await client.on_message(make_message('!yesno'))
+    assert len(sent) == 1
+    await client.on_message(make_message('#yesno'))
+    assert sent[-1] in ['yes', 'no']
+
+    await client.on_message(make_message('#config disable yesno'))
+    await client.on_message(make_message('#config disable Passive test'))
+    await client.on_message(make_message('#yesno passivetest'))
+    assert sent[-1] == 'The command "yesno" is disabled on this server.'
+    assert PassiveTestCommand.triggered == []
+
+    await client.on_message(make_message('#config enable Passive test'))
+    await client.on_message(make_message('passivetest'))
+    assert PassiveTestCommand.triggered == ['1']
+
+
+
+class ArgumentsTestCommand(Command):
+    required_arguments = [Integer('n', minimum=1)]
+    created = 0
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        ArgumentsTestCommand.created += 1
+
+    async def execute(self):
+        return 'n is {}'.format(self.values['n'])
+
+
+@pytest.mark.asyncio
+async def test_invalid_arguments_are_rejected_before_creating_the_command(sent, store):
+    registry.register('argumentstest')(ArgumentsTestCommand)
+    ArgumentsTestCommand.created = 0
+    try:
+        for content in ['!argumentstest', '!argumentstest bla', '!argumentstest 0']:
+            await client.on_message(make_message(content))
+            assert sent[-1].endswith('Usage: **!argumentstest** **<n>**')
+        assert ArgumentsTestCommand.created == 0
+
+        await client.on_message(make_message('!argumentstest 3'))
+        assert sent[-1] == 'n is 3'
+        assert ArgumentsTestCommand.created == 1
+    finally:
+        registry.unregister('argumentstest')
+
+
+def test_restore_broken_session(monkeypatch):
+    cleared = []
+    monkeypatch.setattr('servoskull.session.clear', lambda: cleared.append(True))
+
+    client.client._restore_session({'session_id': 'abc', 'sequence': 42, 'payloads': [{'t': 'NOT_AN_EVENT', 'd': {}}]})
+
+    assert cleared == [True]
+    assert client.client.resuming is False
+    assert client.client.connection.session_id is None
+    assert client.client.connection.sequence is None
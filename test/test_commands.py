@@ -2,6 +2,7 @@ import discord
 import pytest
 
 import servoskull.commands.regular as commands
+from servoskull.commands.arguments import ArgumentError
 
 
 @pytest.mark.asyncio
@@ -53,46 +54,32 @@ async def test_cmd_next_holiday():
 
 @pytest.mark.asyncio
 async def test_cmd_roll():
-    command = commands.CommandRoll()
-    response = await command.execute()
-    assert response == 'Please specify a valid integer >= 2'
-
-    command = commands.CommandRoll(arguments=[])
-    response = await command.execute()
-    assert response == 'Please specify a valid integer >= 2'
-
-    command = commands.CommandRoll(arguments=['1'])
-    response = await command.execute()
-    assert response.startswith('Please specify a valid integer >= 2')
-
-    command = commands.CommandRoll(arguments=['0'])
-    response = await command.execute()
-    assert response.startswith('Please specify a valid integer >= 2')
-
-    command = commands.CommandRoll(arguments=['-23'])
-    response = await command.execute()
-    assert response.startswith('Please specify a valid integer >= 2')
-
-    command = commands.CommandRoll(arguments=['bla'])
-    response = await command.execute()
-    assert response == 'Please specify a valid integer >= 2'
+    for arguments in [None, []]:
+        with pytest.raises(ArgumentError) as error:
+            commands.CommandRoll(arguments=arguments)
+        assert str(error.value).startswith('Missing argument')
 
-    command = commands.CommandRoll(arguments=['bla', 'bla', 'bla'])
-    response = await command.execute()
-    assert response == 'Please specify a valid integer >= 2'
+    for arguments in [['1'], ['0'], ['-23'], ['bla'], ['bla', 'bla', 'bla'], ['0d6'], ['4d6kh5'], ['6', 'bla']]:
+        with pytest.raises(ArgumentError):
+            commands.CommandRoll(arguments=arguments)
 
     command = commands.CommandRoll(arguments=['6'])
     response = await command.execute()
     assert response.startswith('Rolled a 6-sided die:')
 
-    command = commands.CommandRoll(arguments=['6', 'bla'])
-    response = await command.execute()
-    assert response.startswith('Rolled a 6-sided die:')
-
     command = commands.CommandRoll(arguments=['100'])
     response = await command.execute()
     assert response.startswith('Rolled a 100-sided die:')
 
+    command = commands.CommandRoll(arguments=['4d6kh3+2'])
+    response = await command.execute()
+    assert response.startswith('Rolled 4d6kh3+2: **')
+
+    # Words are joined into one expression
+    command = commands.CommandRoll(arguments=['10d10', '+', '5'])
+    response = await command.execute()
+    assert response.startswith('Rolled 10d10+5: **')
+
 
 @pytest.mark.asyncio
 async def test_cmd_xkcd():
@@ -105,3 +92,6 @@ async def test_cmd_xkcd():
     response = await command.execute()
 
     assert response.startswith('https://xkcd.com/')
+
+    with pytest.raises(ArgumentError):
+        commands.CommandXkcd(arguments=[])
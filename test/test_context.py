@@ -0,0 +1,49 @@
+import pickle
+
+from servoskull.context import MessageContext
+from util import DottedDict
+
+
+def test_context_from_message():
+    message = DottedDict(
+        id='1',
+        content='!summon <@!3>',
+        author=DottedDict(id='2', name='user', nick='nick', voice=DottedDict(voice_channel=DottedDict(id='5'))),
+        channel=DottedDict(id='4'),
+        server=DottedDict(id='6'),
+        mentions=[DottedDict(id='3')],
+    )
+    context = MessageContext.from_message(message)
+
+    assert context.message_id == '1'
+    assert context.content == '!summon <@!3>'
+    assert context.author_id == '2'
+    assert context.author_name == 'user'
+    assert context.author_nick == 'nick'
+    assert context.channel_id == '4'
+    assert context.server_id == '6'
+    assert context.mention_ids == ('3',)
+    assert context.voice_channel_id == '5'
+
+
+def test_context_from_private_message():
+    message = DottedDict(
+        id='1',
+        content='!yesno',
+        author=DottedDict(id='2', name='user'),
+        channel=DottedDict(id='4'),
+        server=None,
+        mentions=[],
+    )
+    context = MessageContext.from_message(message)
+
+    assert context.server_id is None
+    assert context.author_nick is None
+    assert context.voice_channel_id is None
+
+
+def test_context_pickle():
+    context = MessageContext(content='test', author_id='2', mention_ids=['3'])
+
+    assert pickle.loads(pickle.dumps(context)) == context
+    assert not hasattr(context, '__dict__')
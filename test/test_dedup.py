@@ -0,0 +1,48 @@
+from servoskull import dedup
+from util import FakeClock
+
+
+def test_recent_messages_duplicates():
+    recent_messages = dedup.RecentMessages(size=10, window=60, clock=FakeClock())
+    duplicates = dedup.counters['duplicates']
+
+    assert recent_messages.is_duplicate('1') is False
+    assert recent_messages.is_duplicate('2') is False
+    assert recent_messages.is_duplicate('1') is True
+    assert dedup.counters['duplicates'] == duplicates + 1
+
+
+def test_recent_messages_window():
+    clock = FakeClock()
+    recent_messages = dedup.RecentMessages(size=10, window=60, clock=clock)
+
+    recent_messages.is_duplicate('1')
+    clock.now = 30
+    recent_messages.is_duplicate('2')
+    clock.now = 61
+
+    assert recent_messages.is_duplicate('1') is False
+    assert recent_messages.is_duplicate('2') is True
+
+
+def test_recent_messages_size():
+    recent_messages = dedup.RecentMessages(size=3, window=60, clock=FakeClock())
+
+    for message_id in range(10):
+        recent_messages.is_duplicate(message_id)
+
+    assert len(recent_messages) == 3
+    assert 6 not in recent_messages
+    assert 9 in recent_messages
+
+
+def test_recent_messages_remember():
+    clock = FakeClock()
+    recent_messages = dedup.RecentMessages(size=10, window=60, clock=clock)
+    recent_messages.remember(['1', '2'])
+
+    assert recent_messages.is_duplicate('1') is True
+    assert recent_messages.is_duplicate('3') is False
+
+    clock.now = 60
+    assert recent_messages.is_duplicate('2') is False
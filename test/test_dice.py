@@ -0,0 +1,67 @@
+import pytest
+
+from servoskull import dice
+
+
+def test_parse():
+    expression = dice.parse('4d6kh3 + 2')
+    assert str(expression) == '4d6kh3+2'
+    assert expression.terms == (dice.Dice(1, 4, 6, False, 'h', 3), dice.Constant(1, 2))
+    assert dice.parse('4d6kh3+2') is dice.parse('4D6KH3+2')
+
+    assert dice.parse('20').is_single_die()
+    assert dice.parse('d20').is_single_die()
+    assert not dice.parse('2d20').is_single_die()
+    assert dice.parse('3d6!-1d4').terms == (dice.Dice(1, 3, 6, True, None, None), dice.Dice(-1, 1, 4, False, None, None))
+
+    for text in ['', '1', 'bla', '0d6', '2d1', '2d6kh3', '2d6*2', '1000001d6', '5+5', '1d6+1000001', '9' * 5000,
+                 '1d6+' + '9' * 1990]:
+        with pytest.raises(dice.DiceError):
+            dice.parse(text)
+
+
+def test_roll():
+    total, results = dice.parse('4d6kh3+2').roll()
+    assert 5 <= total <= 20
+    assert len(results[0].rolls) == 4
+    assert len(results[0].kept) == 3
+    assert min(results[0].kept) >= max(sorted(results[0].rolls)[:1])
+
+    total, results = dice.parse('10d6!').roll()
+    assert len(results[0].rolls) >= 10
+    assert total == sum(results[0].rolls)
+
+
+def test_roll_many_dice():
+    expression = dice.parse('10000d6')
+    total, results = expression.roll()
+    assert 10000 <= total <= 60000
+
+    response = dice.format_result(expression, total, results)
+    assert response.startswith('Rolled 10000d6: **{}**'.format(total))
+    assert '10000d6 (10000 dice): 1: ' in response
+
+    expression = dice.parse('1000d100')
+    response = dice.format_result(expression, *expression.roll())
+    assert 'lowest' in response
+
+
+def test_format_small_roll():
+    expression = dice.parse('2d20kl1')
+    total, results = expression.roll()
+    response = dice.format_result(expression, total, results)
+
+    assert response.startswith('Rolled 2d20kl1: **{}**'.format(total))
+    assert '~~' in response
+
+
+def test_format_long_result():
+    expression = dice.parse('+'.join(['20d1000000'] * dice.MAX_TERMS))
+    response = dice.format_result(expression, *expression.roll())
+
+    assert len(response) <= dice.MAX_RESULT_LENGTH
+    assert response.endswith('more')
+
+    expression = dice.parse('1d6+1000000-' + '+'.join(['20d1000000'] * (dice.MAX_TERMS - 2)))
+    response = dice.format_result(expression, *expression.roll())
+    assert len(response) <= dice.MAX_RESULT_LENGTH
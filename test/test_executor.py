@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from servoskull import executor
+from servoskull.commands import registry
+from servoskull.commands.arguments import Integer
+from servoskull.commands.regular import Command
+
+
+class CommandSleep(Command):
+    required_arguments = [Integer('seconds', optional=True)]
+
+    def run(self):
+        time.sleep(self.values['seconds'] or 0)
+        return 'Ran in {}'.format(os.getpid())
+
+
+class CommandExecutorTest(CommandSleep):
+    pass
+
+
+class CommandExecutorTestProcess(CommandSleep):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def commands():
+    registry.register('executortest', execution=executor.THREAD)(CommandExecutorTest)
+    registry.register('executortestprocess', execution=executor.PROCESS)(CommandExecutorTestProcess)
+    yield
+    registry.unregister('executortest')
+    registry.unregister('executortestprocess')
+
+
+@pytest.mark.asyncio
+async def test_execute_thread():
+    command = registry.commands['executortest']['class'](arguments=[])
+    response = await executor.execute('executortest', command)
+
+    assert response == 'Ran in {}'.format(os.getpid())
+
+
+@pytest.mark.asyncio
+async def test_execute_process():
+    command = registry.commands['executortestprocess']['class'](arguments=[])
+    response = await executor.execute('executortestprocess', command)
+
+    assert response.startswith('Ran in ')
+    assert response != 'Ran in {}'.format(os.getpid())
+
+
+@pytest.mark.asyncio
+async def test_execute_timeout(monkeypatch):
+    monkeypatch.setattr(executor, 'EXECUTOR_TIMEOUT', 0.1)
+    timeouts = executor.counters['timeouts']
+
+    command = registry.commands['executortest']['class'](arguments=['1'])
+    response = await executor.execute('executortest', command)
+
+    assert response == 'Sorry, that took too long.'
+    assert executor.counters['timeouts'] == timeouts + 1
+
+
+@pytest.mark.asyncio
+async def test_execute_replaces_unusable_pool():
+    command = registry.commands['executortestprocess']['class'](arguments=[])
+    await executor.execute('executortestprocess', command)
+
+    # A pool that was shut down can't run commands anymore
+    executor._pools[executor.PROCESS].shutdown()
+    for _ in range(executor.PROCESS_WORKERS + 1):
+        response = await executor.execute('executortestprocess', command)
+        assert response.startswith('Ran in ')
+
+
+@pytest.mark.asyncio
+async def test_execute_releases_semaphore_on_error(monkeypatch):
+    def submit(*args):
+        raise RuntimeError('cannot schedule new futures after shutdown')
+
+    monkeypatch.setattr(executor, '_submit', submit)
+    command = registry.commands['executortest']['class'](arguments=[])
+    for _ in range(executor.THREAD_WORKERS + 1):
+        with pytest.raises(RuntimeError):
+            await executor.execute('executortest', command)
+
+    monkeypatch.undo()
+    assert await executor.execute('executortest', command) == 'Ran in {}'.format(os.getpid())
+
+
+@pytest.mark.asyncio
+async def test_execute_timeout_includes_waiting(monkeypatch):
+    monkeypatch.setattr(executor, 'EXECUTOR_TIMEOUT', 0.2)
+    command = registry.commands['executortest']['class'](arguments=['1'])
+
+    responses = await asyncio.gather(*[
+        executor.execute('executortest', command) for _ in range(executor.THREAD_WORKERS + 1)
+    ])
+
+    assert responses == ['Sorry, that took too long.'] * (executor.THREAD_WORKERS + 1)
+
+
+@pytest.mark.asyncio
+async def test_execute_process_timeout_frees_workers(monkeypatch):
+    monkeypatch.setattr(executor, 'EXECUTOR_TIMEOUT', 0.5)
+    # Start the workers before measuring the timeout
+    await executor.execute('executortestprocess', registry.commands['executortestprocess']['class'](arguments=[]))
+
+    stuck = registry.commands['executortestprocess']['class'](arguments=['60'])
+    for _ in range(executor.PROCESS_WORKERS):
+        assert await executor.execute('executortestprocess', stuck) == 'Sorry, that took too long.'
+
+    monkeypatch.setattr(executor, 'EXECUTOR_TIMEOUT', 10)
+    command = registry.commands['executortestprocess']['class'](arguments=[])
+    assert (await executor.execute('executortestprocess', command)).startswith('Ran in ')
+
+
+def test_invalid_execution():
+    from servoskull import ServoSkullError
+
+    with pytest.raises(ServoSkullError):
+        registry.register('invalid', execution='elsewhere')
@@ -0,0 +1,26 @@
+from servoskull import guildconfig
+
+
+def test_guild_config_store(tmpdir):
+    path = str(tmpdir.join('test.sqlite3'))
+    store = guildconfig.GuildConfigStore(path)
+
+    assert store.get(None) is guildconfig.DEFAULT_CONFIG
+    assert store.get('1') is guildconfig.DEFAULT_CONFIG
+
+    config = store.update('1', prefix='#', disabled_commands={'roll'})
+    assert config.prefix == '#'
+    assert config.disabled_commands == {'roll'}
+    assert store.get('1') is config
+    assert store.get('2') is guildconfig.DEFAULT_CONFIG
+
+    config = store.update('1', autogif=True, disabled_passive_commands=['Reddit comment'])
+    assert config.prefix == '#'
+    assert config.autogif is True
+
+    # A new store has to read the configuration from the database
+    config = guildconfig.GuildConfigStore(path).get('1')
+    assert config.prefix == '#'
+    assert config.autogif is True
+    assert config.disabled_commands == {'roll'}
+    assert config.disabled_passive_commands == {'Reddit comment'}
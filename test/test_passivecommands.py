@@ -1,30 +1,30 @@
 import pytest
 
 from servoskull.commands import passive
-from util import DottedDict
+from servoskull.context import MessageContext
 
 
 @pytest.mark.asyncio
 async def test_reddit_comment_command():
-    command = passive.RedditCommentCommand(message=DottedDict(
+    command = passive.RedditCommentCommand(context=MessageContext(
         content='test'
     ))
     assert command.is_triggered() is False
 
     # Link to a self post
-    command = passive.RedditCommentCommand(message=DottedDict(
+    command = passive.RedditCommentCommand(context=MessageContext(
         content='https://www.reddit.com/r/IAmA/comments/z1c9z/i_am_barack_obama_president_of_the_united_states/'
     ))
     assert command.is_triggered() is False
 
     # Perma-link to a comment in a post
-    command = passive.RedditCommentCommand(message=DottedDict(
+    command = passive.RedditCommentCommand(context=MessageContext(
         content='https://www.reddit.com/r/IAmA/comments/z1c9z/i_am_barack_obama_president_of_the_united_states/c60o0iw/'
     ))
     assert command.is_triggered() is True
 
     url = 'https://www.reddit.com/r/IAmA/comments/z1c9z/i_am_barack_obama_president_of_the_united_states/c60o0iw'
-    command = passive.RedditCommentCommand(message=DottedDict(content='asdf bla {} yada yada'.format(url)))
+    command = passive.RedditCommentCommand(context=MessageContext(content='asdf bla {} yada yada'.format(url)))
     assert command._get_url() == url + '.json'
 
     message = command._compile_message({})
@@ -0,0 +1,102 @@
+import sys
+
+import pytest
+
+from servoskull import ServoSkullError, executor
+from servoskull.commands import registry
+
+PLUGIN = '''
+from servoskull.commands import registry
+from servoskull.commands.regular import Command
+
+
+@registry.register('{trigger}')
+class CommandPluginTest(Command):
+    help_text = '{help_text}'
+'''
+
+
+@pytest.fixture
+def plugin(tmpdir, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmpdir))
+    # Make sure changes to the file aren't hidden by a stale bytecode cache
+    monkeypatch.setattr('sys.dont_write_bytecode', True)
+    package = tmpdir.mkdir('servoskull_test_plugins')
+    package.join('__init__.py').write('')
+    path = package.join('plugin.py')
+
+    def write(trigger, help_text):
+        path.write(PLUGIN.format(trigger=trigger, help_text=help_text))
+
+    yield write
+    if 'servoskull_test_plugins.plugin' in registry.get_modules():
+        registry.unload_module('servoskull_test_plugins.plugin')
+    sys.modules.pop('servoskull_test_plugins.plugin', None)
+    sys.modules.pop('servoskull_test_plugins', None)
+
+
+def test_registry_lookups():
+    assert 'yesno' in registry.get_regular_commands()
+    assert 'yesno' in registry.get_active_commands()
+    assert 'summon' in registry.get_sound_commands()
+    assert 'summon' in registry.get_active_commands()
+    assert 'Reddit comment' in registry.get_passive_commands()
+    assert 'Reddit comment' not in registry.get_active_commands()
+
+
+def test_load_reload_unload_module(plugin):
+    plugin('plugintest', 'v1')
+    assert registry.load_module('servoskull_test_plugins.plugin') == ['plugintest']
+    assert registry.get_active_commands()['plugintest']['class'].help_text == 'v1'
+
+    plugin('plugintest2', 'v2')
+    # Worker processes are replaced so that they don't run the old version
+    executor._get_pool(executor.PROCESS)
+    assert registry.reload_module('servoskull_test_plugins.plugin') == ['plugintest2']
+    assert 'plugintest' not in registry.get_active_commands()
+    assert executor.PROCESS not in executor._pools
+    assert registry.get_active_commands()['plugintest2']['class'].help_text == 'v2'
+
+    # A broken module keeps the previous commands
+    plugin('plugintest3', "'")
+    with pytest.raises(SyntaxError):
+        registry.reload_module('servoskull_test_plugins.plugin')
+    assert 'plugintest2' in registry.get_active_commands()
+
+    # Commands registered before the error are removed again
+    plugin('plugintest3', "v3'\nraise ValueError('broken')\nunused = '")
+    with pytest.raises(ValueError):
+        registry.reload_module('servoskull_test_plugins.plugin')
+    assert registry.get_active_commands()['plugintest2']['class'].help_text == 'v2'
+    assert 'plugintest3' not in registry.commands
+
+    removed = registry.unload_module('servoskull_test_plugins.plugin')
+    assert list(removed) == ['plugintest2']
+    assert 'plugintest2' not in registry.commands
+
+    with pytest.raises(ValueError):
+        registry.load_module('servoskull_test_plugins.plugin')
+    assert 'plugintest3' not in registry.commands
+
+
+def test_refuse_non_commands_modules(plugin, tmpdir):
+    count = len(registry.commands)
+    tmpdir.join('servoskull_test_plugins', 'empty.py').write('')
+
+    for name in ['registry', 'arguments', 'servoskull.settings', 'servoskull_test_plugins.empty']:
+        with pytest.raises(ServoSkullError):
+            registry.load_module(name)
+        with pytest.raises(ServoSkullError):
+            registry.unload_module(name)
+
+    assert len(registry.commands) == count
+    assert 'servoskull.commands.registry' in sys.modules
+    # A new module that doesn't register commands isn't kept
+    assert 'servoskull_test_plugins.empty' not in sys.modules
+
+
+def test_refuse_unloading_owner_commands():
+    with pytest.raises(ServoSkullError):
+        registry.unload_module('meta')
+
+    assert 'reload' in registry.commands
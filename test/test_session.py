@@ -0,0 +1,114 @@
+import json
+import time
+
+from servoskull import session
+
+PAYLOADS = [{'op': 0, 't': 'READY', 's': 1, 'd': {'session_id': 'abc'}}]
+
+
+def test_save_and_load_session(tmpdir):
+    path = str(tmpdir.join('session.json'))
+
+    assert session.load(path) is None
+
+    session.save('abc', 42, PAYLOADS, path=path)
+    saved = session.load(path)
+    assert saved['session_id'] == 'abc'
+    assert saved['sequence'] == 42
+    assert saved['payloads'] == PAYLOADS
+
+    session.clear(path)
+    assert session.load(path) is None
+    session.clear(path)
+
+
+def test_load_old_or_invalid_session(tmpdir):
+    path = tmpdir.join('session.json')
+
+    path.write(json.dumps({'session_id': 'abc', 'sequence': 42, 'saved_at': time.time() - 60, 'payloads': PAYLOADS}))
+    assert session.load(str(path), max_age=120) is not None
+    assert session.load(str(path), max_age=30) is None
+
+    path.write(json.dumps({'session_id': None, 'sequence': 42, 'saved_at': time.time(), 'payloads': PAYLOADS}))
+    assert session.load(str(path)) is None
+
+    path.write('{')
+    assert session.load(str(path)) is None
+
+
+def test_snapshot_is_kept_up_to_date():
+    snapshot = session.Snapshot()
+    snapshot.apply('GUILD_CREATE', {'id': '1'})
+    assert snapshot.payloads() == []
+
+    snapshot.apply('READY', {'session_id': 'abc', 'guilds': [{'id': '1'}, {'id': '2'}]})
+    snapshot.apply('GUILD_CREATE', {
+        'id': '1', 'member_count': 1, 'members': [{'user': {'id': 'a'}, 'roles': []}],
+        'roles': [{'id': 'r1'}], 'channels': [], 'voice_states': [], 'presences': [{'user': {'id': 'a'}}],
+    })
+    snapshot.apply('GUILD_CREATE', {'id': '2'})
+    # A guild that's sent again replaces the previous one
+    snapshot.apply('GUILD_CREATE', {'id': '2', 'name': 'two'})
+
+    snapshot.apply('GUILD_MEMBER_ADD', {'guild_id': '1', 'user': {'id': 'b'}, 'roles': []})
+    snapshot.apply('GUILD_MEMBER_UPDATE', {'guild_id': '1', 'user': {'id': 'a'}, 'roles': ['r2'], 'nick': 'A'})
+    snapshot.apply('GUILD_MEMBER_REMOVE', {'guild_id': '1', 'user': {'id': 'b'}})
+    snapshot.apply('GUILD_ROLE_CREATE', {'guild_id': '1', 'role': {'id': 'r2'}})
+    snapshot.apply('GUILD_ROLE_DELETE', {'guild_id': '1', 'role_id': 'r1'})
+    snapshot.apply('CHANNEL_CREATE', {'guild_id': '1', 'id': 'c1', 'name': 'general'})
+    snapshot.apply('CHANNEL_UPDATE', {'guild_id': '1', 'id': 'c1', 'name': 'chat'})
+    snapshot.apply('VOICE_STATE_UPDATE', {'guild_id': '1', 'user_id': 'a', 'channel_id': 'c1'})
+    snapshot.apply('GUILD_DELETE', {'id': '2'})
+    snapshot.apply('MESSAGE_CREATE', {'guild_id': '1', 'id': 'm1'})
+
+    payloads = snapshot.payloads()
+    assert [payload['t'] for payload in payloads] == ['READY', 'GUILD_CREATE']
+    assert payloads[0]['d']['guilds'] == [{'id': '1'}]
+
+    guild = payloads[1]['d']
+    assert guild['member_count'] == 1
+    assert guild['members'] == [{'user': {'id': 'a'}, 'roles': ['r2'], 'nick': 'A'}]
+    assert guild['roles'] == [{'id': 'r2'}]
+    assert guild['channels'] == [{'guild_id': '1', 'id': 'c1', 'name': 'chat'}]
+    assert guild['voice_states'] == [{'guild_id': '1', 'user_id': 'a', 'channel_id': 'c1'}]
+    assert 'presences' not in guild
+
+
+class Role:
+    pass
+
+
+def test_recorder_copies_events(tmpdir):
+    path = str(tmpdir.join('session.json'))
+    recorder = session.Recorder(path)
+    assert recorder.save('abc', 1).result() is False
+
+    data = {'id': '1', 'members': [{'user': {'id': 'a'}, 'roles': ['r1']}]}
+    recorder.record('READY', {'session_id': 'abc'})
+    recorder.record('GUILD_CREATE', data)
+    # discord.py replaces role IDs with Role objects while parsing
+    data['members'][0]['roles'] = [Role()]
+
+    assert recorder.save('abc', 2).result() is True
+    saved = session.load(path)
+    assert saved['sequence'] == 2
+    assert saved['payloads'][1]['d']['members'][0]['roles'] == ['r1']
+
+
+
+def test_recorder_saves_received_message_ids(tmpdir):
+    path = str(tmpdir.join('session.json'))
+    recorder = session.Recorder(path)
+    recorder.record('MESSAGE_CREATE', {'id': '1', 'content': 'a'})
+    recorder.record('MESSAGE_CREATE', {'id': '2', 'content': 'b'})
+
+    # There's no session to save yet, but saving waits for the recorded events
+    assert recorder.save('abc', 2).result() is False
+    assert session.load_message_ids(path) == ['1', '2']
+
+    # Messages received before a saved session aren't sent again
+    recorder.record('READY', {'session_id': 'abc'})
+    assert recorder.save('abc', 3).result() is True
+    assert session.load_message_ids(path) == []
+
+    assert session.load(path)['sequence'] == 3
@@ -7,6 +7,7 @@ ourselves.
 import pytest
 
 from servoskull.commands import sound
+from servoskull.soundlibrary import library
 
 
 @pytest.mark.asyncio
@@ -14,5 +15,11 @@ async def test_cmd_sounds():
     command = sound.CommandSounds()
     response = await command.execute()
 
-    assert response.startswith('Available sounds:')
-    assert len(response.split('\n')) == len(sound.CommandSound.sounds) + 1
\ No newline at end of file
+    assert response.startswith('Available sounds (page 1 of 1):')
+    assert len(response.split('\n')) == len(library) + 1
+
+    command = sound.CommandSounds(arguments=['ho'])
+    response = await command.execute()
+
+    assert response.startswith('Sounds matching "ho":')
+    assert '**horn**' in response
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from servoskull.soundlibrary import SoundLibrary
+from util import FakeClock
+
+
+def write_manifest(directory, name, sounds):
+    directory.join(name).write(json.dumps({
+        name: {'url': 'https://example.com/{}'.format(name), 'tags': tags} for name, tags in sounds.items()
+    }))
+
+
+def test_sound_library_search(tmpdir):
+    write_manifest(tmpdir, 'a.json', {'horn': ['loud'], 'hornet': [], 'bell': ['Loud']})
+    write_manifest(tmpdir, 'b.json', {'whistle': []})
+    tmpdir.join('broken.json').write('{')
+    library = SoundLibrary(str(tmpdir))
+
+    assert len(library) == 4
+    assert library.get('HORN').url == 'https://example.com/horn'
+    assert library.get('trumpet') is None
+
+    assert library.search('hor') == ['horn', 'hornet']
+    assert library.search('loud') == ['bell', 'horn']
+    assert library.search('whistel') == ['whistle']
+    assert library.search('hor', limit=1) == ['horn']
+
+
+@pytest.mark.asyncio
+async def test_sound_library_search_async(tmpdir):
+    write_manifest(tmpdir, 'a.json', {'horn': [], 'whistle': []})
+    library = SoundLibrary(str(tmpdir))
+
+    assert await library.search_async('whistel') == ['whistle']
+    assert await library.search_async('h', limit=1) == ['horn']
+
+
+def test_sound_library_invalid_sounds(tmpdir):
+    tmpdir.join('a.json').write(json.dumps({
+        'horn': {'url': 'https://example.com/horn', 'tags': ['Loud']},
+        'number': {'url': 'https://example.com/number', 'tags': [1]},
+        'string': {'url': 'https://example.com/string', 'tags': 'loud'},
+        'nourl': {'tags': []},
+        'notadict': 'https://example.com/notadict',
+    }))
+    tmpdir.join('b.json').write('["not", "a", "manifest"]')
+    library = SoundLibrary(str(tmpdir))
+
+    assert len(library) == 1
+    assert library.get('horn').tags == ('loud',)
+    assert library.search('l') == []
+    assert library.search('loud') == ['horn']
+
+
+def test_sound_library_pages(tmpdir):
+    write_manifest(tmpdir, 'a.json', {'sound{:02}'.format(number): [] for number in range(25)})
+    library = SoundLibrary(str(tmpdir))
+    library.page_size = 10
+
+    assert library.page_count() == 3
+    assert len(library.page(1).split('\n')) == 10
+    assert len(library.page(3).split('\n')) == 5
+    assert '**sound20**' in library.page(3)
+    assert library.render('sound00') == '  **sound00**'
+
+
+@pytest.mark.asyncio
+async def test_sound_library_refresh(tmpdir):
+    clock = FakeClock()
+    write_manifest(tmpdir, 'a.json', {'horn': []})
+    library = SoundLibrary(str(tmpdir), refresh_interval=10, clock=clock)
+    assert len(library) == 1
+
+    write_manifest(tmpdir, 'b.json', {'bell': []})
+    await library.refresh_async()
+    assert len(library) == 1
+
+    clock.now = 10
+    await library.refresh_async()
+    assert len(library) == 2
+    assert (await library.get_async('bell')).url == 'https://example.com/bell'
+
+    # Only changed manifests are read again
+    manifest = library._manifests['a.json']
+    tmpdir.join('b.json').remove()
+    library.refresh(force=True)
+    assert len(library) == 1
+    assert library._manifests['a.json'] is manifest
+
+
+def test_sound_library_removed_manifest(tmpdir, monkeypatch):
+    write_manifest(tmpdir, 'a.json', {'horn': []})
+    library = SoundLibrary(str(tmpdir))
+    # The manifest is removed between listing and reading the directory
+    monkeypatch.setattr('os.listdir', lambda path: ['a.json', 'b.json'])
+
+    assert len(library) == 1
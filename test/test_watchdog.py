@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import pytest
+
+from servoskull import watchdog
+
+
+@pytest.mark.asyncio
+async def test_watchdog_attributes_stalls():
+    dog = watchdog.Watchdog(asyncio.get_event_loop(), threshold=0.05)
+    dog.start()
+
+    with watchdog.attribute('blocking command'):
+        time.sleep(0.3)
+    await asyncio.sleep(0.2)
+    dog.stop()
+
+    assert watchdog.counters['stalls'] >= 1
+    assert watchdog.counters['stalls:blocking command'] >= 1
+    assert watchdog.counters['stall_seconds'] >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_attribute_restores_previous_label():
+    task = watchdog._current_task(asyncio.get_event_loop())
+
+    with watchdog.attribute('outer'):
+        with watchdog.attribute('inner'):
+            assert watchdog._in_flight[task] == 'inner'
+        assert watchdog._in_flight[task] == 'outer'
+
+    assert task not in watchdog._in_flight
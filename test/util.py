@@ -14,4 +14,15 @@ class DottedDict(dict):
         message.content == 'asdf'
     """
     def __getattr__(self, item):
-        return self.get(item)
\ No newline at end of file
+        return self.get(item)
+
+class FakeClock:
+    """A clock for classes that take a `clock` function, e. g. `time.monotonic`.
+
+    The time only changes when `now` is set.
+    """
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now